@@ -0,0 +1,8 @@
+from django.db.backends.mysql import base
+
+from config.backends.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def check_pooled_connection(self, connection):
+        connection.ping()
@@ -0,0 +1,243 @@
+import threading
+import time
+from collections import deque
+
+from django.db.utils import OperationalError
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of raw DB-API connections shared by every thread of a
+    process.
+
+    ``acquire`` hands out the most recently released idle connection,
+    pinging it first with ``check`` if it sat idle for longer than
+    ``health_check_interval`` seconds; dead ones are replaced. At most
+    ``max_size`` connections exist at once and callers wait up to
+    ``timeout`` seconds for one to be released. Connections idle for more
+    than ``max_idle`` seconds are closed, down to ``min_size``, whenever a
+    connection is acquired or released; ``fill`` opens connections up to
+    ``min_size``.
+    """
+
+    def __init__(
+        self, connect, check, min_size=0, max_size=10, timeout=10.0,
+        max_idle=300.0, health_check_interval=30.0
+    ):
+        self.connect = connect
+        self.check = check
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+        self._idle = deque()
+        self._size = 0
+        self._condition = threading.Condition()
+        self.stats = {
+            'acquired': 0,
+            'created': 0,
+            'closed': 0,
+            'timeouts': 0,
+            'wait_seconds': 0.0,
+        }
+
+    def get_stats(self):
+        with self._condition:
+            return {
+                **self.stats,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+            }
+
+    def fill(self):
+        while True:
+            with self._condition:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                connection = self.connect()
+            except Exception:
+                with self._condition:
+                    self._size -= 1
+                raise
+            with self._condition:
+                self.stats['created'] += 1
+                self._idle.appendleft((connection, time.monotonic()))
+                self._condition.notify()
+
+    def acquire(self):
+        start = time.monotonic()
+        with self._condition:
+            expired = self._reap(start)
+            while True:
+                if self._idle:
+                    connection, released_at = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    # Connect outside the lock; the slot is reserved.
+                    self._size += 1
+                    connection = released_at = None
+                    break
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0 or not self._condition.wait(remaining):
+                    if not self._idle and self._size >= self.max_size:
+                        self.stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            f'No database connection became free within {self.timeout}s.'
+                        )
+            self.stats['acquired'] += 1
+            self.stats['wait_seconds'] += time.monotonic() - start
+        for expired_connection in expired:
+            self._close_quietly(expired_connection)
+
+        if connection is not None and (
+            time.monotonic() - released_at < self.health_check_interval
+            or self._is_healthy(connection)
+        ):
+            return connection
+        if connection is not None:
+            self._close(connection, reserve=True)
+        try:
+            connection = self.connect()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self.stats['created'] += 1
+        return connection
+
+    def _is_healthy(self, connection):
+        try:
+            self.check(connection)
+        except Exception:
+            return False
+        return True
+
+    def _reap(self, now):
+        # Called with the lock held; the caller closes what is returned.
+        expired = []
+        # The oldest idle connections sit at the left end.
+        while (
+            self._idle and self._size - len(expired) > self.min_size
+            and now - self._idle[0][1] > self.max_idle
+        ):
+            expired.append(self._idle.popleft()[0])
+        self._size -= len(expired)
+        self.stats['closed'] += len(expired)
+        return expired
+
+    def release(self, connection):
+        now = time.monotonic()
+        with self._condition:
+            self._idle.append((connection, now))
+            self._condition.notify()
+            expired = self._reap(now)
+        for connection in expired:
+            self._close_quietly(connection)
+
+    def discard(self, connection):
+        self._close(connection)
+
+    def _close(self, connection, reserve=False):
+        # ``reserve`` keeps the slot for a replacement connection.
+        with self._condition:
+            self.stats['closed'] += 1
+            if not reserve:
+                self._size -= 1
+                self._condition.notify()
+        self._close_quietly(connection)
+
+    def _close_quietly(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close(self):
+        with self._condition:
+            idle, self._idle = self._idle, deque()
+            self._size -= len(idle)
+            self.stats['closed'] += len(idle)
+        for connection, _ in idle:
+            self._close_quietly(connection)
+
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool_stats(*names):
+    # Summed per database alias across pools with different parameters.
+    totals = {}
+    for (alias, _), pool in list(pools.items()):
+        stats = pool.get_stats()
+        for name in names:
+            key = (alias, name) if len(names) > 1 else (alias,)
+            totals[key] = totals.get(key, 0) + stats[name]
+    return totals
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Mixin for a DatabaseWrapper that borrows connections from a per-process
+    ConnectionPool instead of opening one per thread, configured by the
+    ``POOL`` dict of the database's settings. Closing the wrapper, e.g. via
+    close_old_connections(), returns the connection to the pool, so with the
+    default CONN_MAX_AGE of 0 threads hold a connection only while they use
+    it and never pay for TCP and authentication after warm-up.
+    """
+
+    def check_pooled_connection(self, connection):
+        # Backends with a cheaper ping, e.g. MySQL, override this.
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+        finally:
+            cursor.close()
+
+    def get_pool(self, conn_params):
+        key = (self.alias, repr(sorted(conn_params.items())))
+        pool = pools.get(key)
+        if pool is None:
+            with pools_lock:
+                pool = pools.get(key)
+                if pool is None:
+                    options = self.settings_dict.get('POOL', {})
+                    pool = pools[key] = ConnectionPool(
+                        connect=lambda: super(
+                            PooledDatabaseWrapperMixin, self
+                        ).get_new_connection(conn_params),
+                        check=self.check_pooled_connection,
+                        min_size=options.get('MIN_SIZE', 0),
+                        max_size=options.get('MAX_SIZE', 10),
+                        timeout=options.get('TIMEOUT', 10.0),
+                        max_idle=options.get('MAX_IDLE', 300.0),
+                        health_check_interval=options.get('HEALTH_CHECK_INTERVAL', 30.0),
+                    )
+                    pool.fill()
+        return pool
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        return self.pool.acquire()
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # Connections closed mid-transaction or after errors are not reused.
+        if self.in_atomic_block or (self.errors_occurred and not self.is_usable()):
+            self.pool.discard(self.connection)
+            return
+        if not self.get_autocommit():
+            with self.wrap_database_errors:
+                self.connection.rollback()
+        self.pool.release(self.connection)
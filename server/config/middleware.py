@@ -1,38 +1,262 @@
+import threading
+import time
+from collections import OrderedDict
 from urllib.parse import parse_qs
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
-from django.db import close_old_connections
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils.functional import cached_property
 from channels.auth import AuthMiddleware
-from channels.db import database_sync_to_async
 from channels.sessions import CookieMiddleware, SessionMiddleware
+from rest_framework_simplejwt.models import TokenUser
 from rest_framework_simplejwt.tokens import AccessToken
 
+from core import metrics
+from core.db import database_sync_to_async
+
 
 User = get_user_model()
 
 
+class UserCache:
+    """
+    Per-process LRU cache of resolved WebSocket users.
+
+    Entries are keyed by ``(user_id, jti, exp)`` so a refreshed token never
+    reuses a stale entry, and they expire after ``ttl`` seconds or when the
+    token itself expires, whichever comes first.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def set(self, key, user, group_names, generation):
+        expires_at = min(time.time() + self.ttl, key[2])
+        with self._lock:
+            # Drop results loaded before an invalidation raced with the load.
+            if generation != self._generation:
+                return
+            self._entries[key] = (user, group_names, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._generation += 1
+            for key in [key for key in self._entries if key[0] == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+user_cache = UserCache(
+    max_size=settings.WEBSOCKET_USER_CACHE['MAX_SIZE'],
+    ttl=settings.WEBSOCKET_USER_CACHE['TTL'],
+)
+metrics.registry.collect(
+    'websocket_user_cache_entries', 'Users cached by the WebSocket auth middleware.',
+    lambda: len(user_cache)
+)
+
+
+class TokenDenylist:
+    """
+    Per-process record of revoked access tokens and stale claims, consulted
+    by stateless handshakes that never read the user row.
+
+    Single tokens are revoked by ``jti`` until they expire and are refused.
+    Marking a user stale, after they were deactivated, deleted or changed
+    groups, flags every token issued to them up to that moment by its
+    ``iat``; those handshakes load the user from the database instead.
+    Access tokens copy ``iat`` from the refresh token they came from, so
+    these entries are kept for ``retention`` seconds, the longest a token
+    issued before the change can stay valid.
+    """
+
+    def __init__(self, retention):
+        self.retention = retention
+        self._tokens = {}
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tokens) + len(self._users)
+
+    def _prune(self, now):
+        self._tokens = {
+            jti: expires_at for jti, expires_at in self._tokens.items()
+            if expires_at > now
+        }
+        self._users = {
+            user_id: revoked_at for user_id, revoked_at in self._users.items()
+            if revoked_at + self.retention > now
+        }
+
+    def revoke_token(self, jti, expires_at):
+        with self._lock:
+            self._prune(time.time())
+            self._tokens[jti] = expires_at
+
+    def mark_stale(self, user_id):
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            self._users[user_id] = now
+
+    def is_revoked(self, access_token):
+        return access_token.get('jti') in self._tokens
+
+    def is_stale(self, access_token):
+        changed_at = self._users.get(access_token['id'])
+        # ``iat`` is truncated to the second, so tokens issued in the second
+        # of a change are treated as stale too.
+        return changed_at is not None and access_token.get('iat', 0) <= changed_at
+
+    def clear(self):
+        with self._lock:
+            self._tokens.clear()
+            self._users.clear()
+
+
+token_denylist = TokenDenylist(retention=(
+    settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME']
+    + settings.SIMPLE_JWT['REFRESH_TOKEN_LIFETIME']
+).total_seconds())
+metrics.registry.collect(
+    'websocket_token_denylist_entries', 'Revoked tokens and stale users held in memory.',
+    lambda: len(token_denylist)
+)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+    if kwargs.get('signal') is post_delete or not instance.is_active:
+        token_denylist.mark_stale(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_cached_user_groups(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # The group's members are unknown once it has been cleared.
+        for user_id in instance.user_set.values_list('id', flat=True):
+            token_denylist.mark_stale(user_id)
+        return
+    if not action.startswith('post_'):
+        return
+    # Role claims in tokens issued before the change are stale.
+    if not reverse:
+        user_cache.invalidate(instance.pk)
+        token_denylist.mark_stale(instance.pk)
+    elif pk_set:
+        for user_id in pk_set:
+            user_cache.invalidate(user_id)
+            token_denylist.mark_stale(user_id)
+    else:
+        user_cache.clear()
+
+
+class ClaimsUser(TokenUser):
+    """
+    User built from a verified access token's claims without a query.
+    ``group_names`` come from the ``groups`` claim set at log in. Consumers
+    only use the user's id, so no ``User`` row is ever loaded for it.
+    """
+
+    @cached_property
+    def first_name(self):
+        return self.token.get('first_name', '')
+
+    @cached_property
+    def last_name(self):
+        return self.token.get('last_name', '')
+
+    @cached_property
+    def group_names(self):
+        return tuple(self.token['groups'])
+
 
 @database_sync_to_async
-def get_user(scope):
-    close_old_connections()
+def load_user(user_id):
+    user = User.objects.get(id=user_id)
+    group_names = tuple(user.groups.values_list('name', flat=True))
+    return user, group_names
+
+
+async def get_user(scope):
     query_string = parse_qs(scope['query_string'].decode())
     token = query_string.get('token')
     if not token:
-        return AnonymousUser()
+        return AnonymousUser(), ()
     try:
         access_token = AccessToken(token[0])
-        user = User.objects.get(id=access_token['id'])
+        if token_denylist.is_revoked(access_token):
+            return AnonymousUser(), ()
+        if (
+            settings.WEBSOCKET_STATELESS_AUTH['ENABLED']
+            and 'groups' in access_token
+            and not token_denylist.is_stale(access_token)
+        ):
+            user = ClaimsUser(access_token)
+            return user, user.group_names
+        key = (
+            access_token['id'],
+            access_token.get('jti'),
+            access_token['exp'],
+        )
+        cached = user_cache.get(key)
+        if cached is None:
+            generation = user_cache.generation
+            cached = await load_user(access_token['id'])
+            user_cache.set(key, *cached, generation)
+        user, group_names = cached
     except Exception as exception:
-        return AnonymousUser()
+        return AnonymousUser(), ()
     if not user.is_active:
-        return AnonymousUser()
-    return user
+        return AnonymousUser(), ()
+    return user, group_names
 
 
 class TokenAuthMiddleware(AuthMiddleware):
     async def resolve_scope(self, scope):
-        scope['user']._wrapped = await get_user(scope)
+        if metrics.ENABLED:
+            start = time.perf_counter()
+            user, group_names = await get_user(scope)
+            metrics.auth_seconds.observe(time.perf_counter() - start)
+        else:
+            user, group_names = await get_user(scope)
+        scope['user']._wrapped = user
+        scope['user_groups'] = group_names
 
 
 def TokenAuthMiddlewareStack(inner):
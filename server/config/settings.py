@@ -79,9 +79,12 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
+# The pooled MySQL backend (see config.backends.pool) shares up to
+# POOL['MAX_SIZE'] connections between all threads of a process; closed
+# connections go back to the pool, so CONN_MAX_AGE stays at 0.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        'ENGINE': 'config.backends.mysql',
         'NAME': 'db',
         'USER': 'user',
         'PASSWORD': 'password',
@@ -90,22 +93,174 @@ DATABASES = {
         'TEST': {
             'NAME': 'test_database',
         },
+        'POOL': {
+            'MIN_SIZE': 2,
+            'MAX_SIZE': 20,
+            'TIMEOUT': 10.0,
+            'MAX_IDLE': 300.0,
+            'HEALTH_CHECK_INTERVAL': 30.0,
+        },
     }
 }
 
 REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379')
 
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
-        'CONFIG': {
-            'hosts': [REDIS_URL],
+# 'local' keeps channels and groups in process memory (core.layers.
+# LocalChannelLayer) and only suits a single server process; 'redis' is
+# required once several processes serve WebSockets.
+CHANNEL_LAYER = os.getenv('CHANNEL_LAYER', 'redis')
+
+if CHANNEL_LAYER == 'local':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'core.layers.LocalChannelLayer',
+            'CONFIG': {
+                'capacity': 100,
+                'expiry': 60,
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'core.layers.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': [REDIS_URL],
+            },
         },
+    }
+
+# Per-process cache of users resolved by config.middleware.TokenAuthMiddleware.
+WEBSOCKET_USER_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 300,
+}
+
+# Opt-in stateless WebSocket auth: handshakes trust the verified access
+# token's claims, including the groups claim set at log in, and run no
+# queries. Tokens issued before a deactivation or group change fall back to
+# loading the user, but only in the process that saw the change (see
+# config.middleware.TokenDenylist); elsewhere they apply when tokens expire.
+WEBSOCKET_STATELESS_AUTH = {
+    'ENABLED': os.getenv('WEBSOCKET_STATELESS_AUTH', '') == '1',
+}
+
+# Token-bucket limits on inbound WebSocket messages (see core.throttling),
+# as (messages per second, burst) per message type, for each connection and
+# for each user across their connections; '*' covers the other types.
+WEBSOCKET_RATE_LIMITS = {
+    'CONNECTION': {
+        'create.dispatch': (2, 10),
+        'create.dispatch.batch': (0.5, 2),
+        'update.dispatch': (5, 20),
+        'claim.dispatch': (2, 10),
+        'location.update': (5, 10),
+        '*': (10, 20),
     },
+    'USER': {
+        'create.dispatch': (5, 20),
+        'create.dispatch.batch': (1, 4),
+        'update.dispatch': (10, 40),
+        'claim.dispatch': (5, 20),
+        'location.update': (10, 20),
+        '*': (20, 40),
+    },
+}
+
+# Messages that need the database are refused with an error frame while
+# MAX_PENDING database calls from async code are queued or running, so a
+# backlog is shed rather than slowing every connection down. The default
+# allows four calls per DATABASE_THREAD_POOL_SIZE thread.
+WEBSOCKET_ADMISSION = {
+    'MAX_PENDING': 64,
+}
+
+# Per-connection outbound queues (see core.outbound). Clients whose queue
+# holds MAX_SIZE frames or whose oldest frame waited MAX_LAG seconds are
+# disconnected.
+WEBSOCKET_OUTBOUND = {
+    'MAX_SIZE': 256,
+    'MAX_LAG': 10.0,
+}
+
+# Replay of missed dispatch updates (see core.models.DispatchEvent). The
+# prune_dispatch_events command deletes the events of dispatches completed
+# more than RETENTION seconds ago; reconnecting clients are caught up on at
+# most MAX_RESUMED dispatches they pass a last_seq for.
+DISPATCH_EVENTS = {
+    'RETENTION': 86400,
+    'MAX_RESUMED': 100,
+}
+
+# Geohash sharding of contractor broadcasts (see core.geo). New dispatches
+# with coordinates go to the cells within RADIUS of the pickup, widening one
+# ring every ESCALATION_DELAY seconds up to MAX_RADIUS while unclaimed.
+DISPATCH_GEO = {
+    'PRECISION': 5,
+    'RADIUS': 1,
+    'MAX_RADIUS': 3,
+    'ESCALATION_DELAY': 15,
 }
 
 AUTH_USER_MODEL = 'core.User'
 
+# Contractor location streaming (see core.locations). Positions live in
+# memory; rebroadcasts to dispatch groups are coalesced to one per
+# BROADCAST_INTERVAL seconds per connection and changed positions are
+# written to the database in batches every PERSIST_INTERVAL seconds.
+LOCATION_STREAM = {
+    'MAX_POSITIONS': 100000,
+    'BROADCAST_INTERVAL': 2.0,
+    'PERSIST_INTERVAL': 30.0,
+}
+
+# In-process index of live contractor positions used for nearest-contractor
+# matching (see core.spatial). CELL_SIZE is in degrees.
+CONTRACTOR_INDEX = {
+    'CELL_SIZE': 0.01,
+    'K': 10,
+    'MAX_DISTANCE': 50.0,
+}
+
+# Round-based assignment of dispatches (see core.matching). When enabled,
+# dispatches with pickup coordinates are collected for WINDOW seconds and
+# offered to one contractor each instead of broadcast. SOLVER is 'greedy' or
+# 'hungarian' (needs numpy and scipy); distances are in km.
+DISPATCH_MATCHER = {
+    'ENABLED': False,
+    'WINDOW': 1.0,
+    'SOLVER': 'greedy',
+    'CANDIDATES': 5,
+    'MAX_DISTANCE': 10.0,
+    'OFFER_TIMEOUT': 15,
+    'FALLBACK_AFTER': 60,
+}
+
+# Hot-path instrumentation (see core.metrics), exposed in the Prometheus text
+# format at /metrics to staff users and to scrapers sending
+# "Authorization: Bearer <TOKEN>". Serve that path on an internal interface
+# only.
+METRICS = {
+    'ENABLED': os.getenv('METRICS_ENABLED', '') == '1',
+    'TOKEN': os.getenv('METRICS_TOKEN', ''),
+}
+
+# Threads running database calls made from async code (see core.db); each
+# borrows a connection from the database pool for the length of a call.
+DATABASE_THREAD_POOL_SIZE = 16
+
+# Largest batch accepted by create.dispatch.batch and /api/dispatch/batch/.
+DISPATCH_BATCH_MAX_SIZE = 500
+
+# Version of the UUIDs generated for new Dispatch primary keys. 7 is
+# time-ordered and keeps InnoDB inserts appending to the clustered index;
+# 4 restores random UUIDs. Both share the same wire format.
+DISPATCH_ID_VERSION = 7
+
+# MySQL ignores the partial indexes on core.Dispatch; the composite indexes
+# next to them cover the same queries there.
+SILENCED_SYSTEM_CHECKS = ['models.W037']
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
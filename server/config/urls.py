@@ -17,7 +17,7 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenRefreshView
 
-from core.views import SignUpView, LogInView
+from core.views import SignUpView, LogInView, MetricsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -25,4 +25,5 @@ urlpatterns = [
     path('api/log_in/', LogInView.as_view(), name='log_in'), # new
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'), # new
     path('api/dispatch/', include('core.urls', 'core',)),
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
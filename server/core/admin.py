@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as DefaultUserAdmin
 
-from .models import User, Dispatch
+from .models import ContractorLocation, DispatchEvent, User, Dispatch
 
 
 @admin.register(User)
@@ -13,8 +13,10 @@ class UserAdmin(DefaultUserAdmin):
 class DispatchAdmin(admin.ModelAdmin):
     fields = (
         'id', 'request_location', 'destination', 'status',
+        'request_latitude', 'request_longitude',
+        'destination_latitude', 'destination_longitude',
         'contractor', 'requestor',
-        'created_at', 'updated_at',
+        'created_at', 'updated_at', 'version',
     )
     list_display = (
         'id', 'request_location', 'destination', 'status',
@@ -25,5 +27,28 @@ class DispatchAdmin(admin.ModelAdmin):
         'status',
     )
     readonly_fields = (
-        'id', 'created_at', 'updated_at',
+        'id', 'created_at', 'updated_at', 'version',
+    )
+
+    def save_model(self, request, obj, form, change):
+        # Admin edits invalidate versions held by WebSocket clients too.
+        if change:
+            obj.version += 1
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(ContractorLocation)
+class ContractorLocationAdmin(admin.ModelAdmin):
+    list_display = (
+        'contractor', 'latitude', 'longitude', 'recorded_at',
+    )
+
+
+@admin.register(DispatchEvent)
+class DispatchEventAdmin(admin.ModelAdmin):
+    list_display = (
+        'seq', 'dispatch', 'created_at',
+    )
+    readonly_fields = (
+        'seq', 'dispatch', 'payload', 'created_at',
     )
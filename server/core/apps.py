@@ -4,3 +4,29 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # The pool backend does not depend on core; its stats are exposed here.
+        from config.backends.pool import get_pool_stats
+        from core import metrics
+
+        metrics.registry.collect(
+            'database_pool_connections', 'Pooled database connections.',
+            lambda: get_pool_stats('idle', 'in_use'), labels=('alias', 'state')
+        )
+        for name, stat, description in (
+            ('database_pool_acquisitions_total', 'acquired',
+             'Connections handed out by the pool.'),
+            ('database_pool_wait_seconds_total', 'wait_seconds',
+             'Time spent waiting for a pooled connection.'),
+            ('database_pool_connections_created_total', 'created',
+             'Database connections opened by the pool.'),
+            ('database_pool_connections_closed_total', 'closed',
+             'Database connections closed by the pool.'),
+            ('database_pool_timeouts_total', 'timeouts',
+             'Waits for a pooled connection that timed out.'),
+        ):
+            metrics.registry.collect(
+                name, description, lambda stat=stat: get_pool_stats(stat),
+                kind='counter', labels=('alias',)
+            )
@@ -0,0 +1,87 @@
+import math
+import time
+from contextlib import contextmanager
+
+from channels.db import DatabaseSyncToAsync as StockDatabaseSyncToAsync
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import override_settings
+
+from core import db
+from core.models import Dispatch
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def unthrottled():
+    # Load generators would otherwise measure WebSocket rate limiting and
+    # load shedding (see core.throttling) rather than the server.
+    return override_settings(
+        WEBSOCKET_RATE_LIMITS={'CONNECTION': {}, 'USER': {}},
+        WEBSOCKET_ADMISSION={'MAX_PENDING': math.inf},
+    )
+
+
+@contextmanager
+def stock_database_sync_to_async():
+    # Baseline for core.db: database calls go through channels' own
+    # thread-sensitive helper again, all on one shared thread.
+    original = db.DatabaseSyncToAsync.__call__
+
+    async def call(self, *args, **kwargs):
+        return await StockDatabaseSyncToAsync(self.func)(*args, **kwargs)
+
+    db.DatabaseSyncToAsync.__call__ = call
+    try:
+        yield
+    finally:
+        db.DatabaseSyncToAsync.__call__ = original
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+@contextmanager
+def rollback():
+    # Benchmarks write fixtures into the configured database; roll them back.
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def create_fixture_users(count, prefix='bench'):
+    User = get_user_model()
+    User.objects.bulk_create([
+        User(
+            username=f'{prefix}.{index}@example.com',
+            first_name='Bench',
+            last_name=f'User {index}',
+        )
+        for index in range(count)
+    ])
+    return list(User.objects.filter(username__startswith=f'{prefix}.'))
+
+
+def create_fixture_dispatches(count, users, statuses=None):
+    statuses = statuses or [status for status, _ in Dispatch.STATUSES]
+    dispatches = [
+        Dispatch(
+            request_location=f'{index} Main Street',
+            destination=f'{index} Piney Road',
+            status=statuses[index % len(statuses)],
+            requestor=users[index % len(users)],
+            contractor=users[(index + 1) % len(users)],
+        )
+        for index in range(count)
+    ]
+    Dispatch.objects.bulk_create(dispatches, batch_size=500)
+    return dispatches
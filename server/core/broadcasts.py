@@ -0,0 +1,61 @@
+import asyncio
+
+from core import geo, metrics
+from core.encoding import encoded_message
+
+
+def user_group(user_id):
+    return f'user.{user_id}'
+
+
+def get_contractor_groups(items, radii):
+    """
+    Map each contractor group to the payloads it should receive for the given
+    ``(dispatch, dispatch_data)`` items: the geohash rings in ``radii`` around
+    the pickup, or the global 'contractors' group without coordinates.
+    """
+    groups = {}
+    for dispatch, dispatch_data in items:
+        if dispatch.has_request_coordinates:
+            targets = [
+                group
+                for radius in radii
+                for group in geo.ring_groups(
+                    dispatch.request_latitude, dispatch.request_longitude, radius
+                )
+            ]
+        else:
+            targets = ['contractors']
+        for group in targets:
+            groups.setdefault(group, []).append(dispatch_data)
+    return groups
+
+
+def encode_dispatches(dispatches_data, cache=None):
+    # Payload lists holding the same objects share one encoded message.
+    key = tuple(map(id, dispatches_data))
+    if cache is not None and key in cache:
+        return cache[key]
+    if len(dispatches_data) == 1:
+        message = encoded_message({
+            'type': 'echo.message',
+            'data': dispatches_data[0],
+        }, key=f"{dispatches_data[0]['id']}")
+    else:
+        message = encoded_message({
+            'type': 'echo.batch',
+            'data': dispatches_data,
+        })
+    if cache is not None:
+        cache[key] = message
+    return message
+
+
+async def send_to_groups(channel_layer, groups, cache=None):
+    cache = {} if cache is None else cache
+    if metrics.ENABLED:
+        metrics.group_fan_out.observe(len(groups))
+    await asyncio.gather(*(
+        channel_layer.group_send(group, encode_dispatches(dispatches_data, cache))
+        for group, dispatches_data in groups.items()
+    ))
@@ -1,140 +1,690 @@
+import asyncio
+import time
+import uuid
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
-from channels.db import database_sync_to_async
 
-from core.serializers import NestedDispatchSerializer, DispatchSerializer
-from core.models import Dispatch
+from core import geo, metrics
+from core.db import database_sync_to_async
+from core.broadcasts import (
+    encode_dispatches, get_contractor_groups, send_to_groups, user_group
+)
+from core.encoding import dumps, encoded_message, loads, pack, pack_text, unpack
+from core.escalation import escalator
+from core.layers import group_add_many, group_discard_many, group_send_many
+from core.locations import position_store
+from core.matching import matcher
+from core.outbound import OutboundQueue
+from core.spatial import contractor_index
+from core.throttling import RateLimiter, admission, rejected_messages, user_limiter
+from core.serializers import DispatchReadSerializer, DispatchSerializer
+from core.models import Dispatch, DispatchEvent
 
 
 class DispatchConsumer(AsyncJsonWebsocketConsumer):
     groups = ['test']
+    user_role = None
+    dispatch_ids = frozenset()
+    geo_group = None
+    status_update_fields = frozenset(('id', 'status', 'version'))
+    message_types = frozenset((
+        'create.dispatch', 'create.dispatch.batch', 'echo.message',
+        'update.dispatch', 'claim.dispatch', 'decline.dispatch', 'location.update',
+    ))
+    database_message_types = frozenset((
+        'create.dispatch', 'create.dispatch.batch', 'update.dispatch', 'claim.dispatch',
+    ))
+    # "Try again later": sent to clients whose outbound queue fell behind.
+    slow_consumer_close_code = 1013
+    # "Internal error": sent when writing to the client failed.
+    write_error_close_code = 1011
+    # Clients offering this subprotocol exchange MessagePack binary frames
+    # and receive dispatch updates as deltas of the changed fields.
+    binary_subprotocol = 'dispatch.msgpack'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._location_task = None
+        self._last_location_broadcast = 0.0
+        self.outbound = None
+        self.binary = False
+        # Whether this contractor can be matched with new dispatches.
+        self.available = True
+        self.rate_limiter = RateLimiter(settings.WEBSOCKET_RATE_LIMITS['CONNECTION'])
 
     @database_sync_to_async
     def _create_dispatch(self, data):
         serializer = DispatchSerializer(data=data)
         serializer.is_valid(raise_exception=True)
-        return serializer.create(serializer.validated_data)
+        dispatch = serializer.create(serializer.validated_data)
+        return dispatch, DispatchReadSerializer(dispatch).data
 
     @database_sync_to_async
-    def _get_dispatch_data(self, dispatch):
-        return NestedDispatchSerializer(dispatch).data
+    def _get_connection_state(self, user, group_names=None):
+        if group_names is None:
+            group_names = user.groups.values_list('name', flat=True)
+        # Filtered by id, so token-only users need no User row.
+        if 'contractor' in group_names:
+            user_role = 'contractor'
+            dispatches = Dispatch.objects.filter(contractor_id=user.id)
+        else:
+            user_role = 'requestor'
+            dispatches = Dispatch.objects.filter(requestor_id=user.id)
+        dispatch_ids = dispatches.exclude(
+            status=Dispatch.COMPLETED
+        ).values_list('id', flat=True)
+        return user_role, {f'{dispatch_id}' for dispatch_id in dispatch_ids}
 
     @database_sync_to_async
-    def _get_user_group(self, user):
-        return user.groups.first().name
+    def _create_dispatch_batch(self, data):
+        serializer = DispatchSerializer(data=data, many=True)
+        if not serializer.is_valid():
+            return None, serializer.errors
+        dispatches = serializer.save()
+        dispatches_data = DispatchReadSerializer(dispatches, many=True).data
+        return list(zip(dispatches, dispatches_data)), None
 
     @database_sync_to_async
-    def _get_dispatch_ids(self, user):
-        user_groups = user.groups.values_list('name', flat=True)
-        if 'contractor' in user_groups:
-            dispatch_ids = user.contractors.exclude(
-                status=Dispatch.COMPLETED
-            ).only('id').values_list('id', flat=True)
-        else:
-            dispatch_ids = user.requestors.exclude(
-                status=Dispatch.COMPLETED
-            ).only('id').values_list('id', flat=True)
-        return map(str, dispatch_ids)
+    def _claim_dispatch(self, dispatch_id, contractor):
+        with transaction.atomic():
+            if not Dispatch.claim(dispatch_id, contractor):
+                return None, None
+            dispatch = Dispatch.objects.select_related(
+                'requestor', 'contractor'
+            ).get(id=dispatch_id)
+            content = DispatchEvent.record(dispatch_id, {
+                'type': 'echo.message',
+                'data': DispatchReadSerializer(dispatch).data,
+            })
+        return dispatch, content
 
     @database_sync_to_async
-    def _update_dispatch(self, data):
-        instance = Dispatch.objects.get(id=data.get('id'))
-        serializer = DispatchSerializer(data=data)
+    def _update_dispatch(self, dispatch_id, data, expected_version):
+        instance = Dispatch.objects.filter(id=dispatch_id).first()
+        if instance is None:
+            return None, None, None, 'Dispatch not found.'
+        serializer = DispatchSerializer(instance, data=data, partial=True)
         serializer.is_valid(raise_exception=True)
-        return serializer.update(instance, serializer.validated_data)
+        changes = {
+            name: value for name, value in serializer.validated_data.items()
+            if getattr(instance, name) != value
+        }
+        status = changes.get('status', instance.status)
+        if not Dispatch.can_transition(instance.status, status):
+            return None, None, None, f'Cannot move dispatch from {instance.status} to {status}.'
+        if expected_version is None:
+            expected_version = instance.version
+        if expected_version != instance.version:
+            return None, None, None, 'Dispatch was modified by another update.'
+        for name, value in changes.items():
+            setattr(instance, name, value)
+        with transaction.atomic():
+            if changes and not instance.save_if_version(expected_version, changes):
+                return None, None, None, 'Dispatch was modified by another update.'
+            content = {
+                'type': 'echo.message',
+                'data': DispatchReadSerializer(instance).data,
+            }
+            if not changes:
+                return instance, content, None, None
+            content = DispatchEvent.record(instance.id, content)
+        delta = {
+            'type': 'echo.message',
+            'data': {
+                name: content['data'][name]
+                for name in ('id', 'version', 'updated_at', *changes)
+            },
+            'partial': True,
+            'seq': content['seq'],
+        }
+        return instance, content, delta, None
+
+    @database_sync_to_async
+    def _update_dispatch_status(self, dispatch_id, status, contractor_id, expected_version):
+        with transaction.atomic():
+            result = Dispatch.transition(
+                dispatch_id, status, contractor_id, expected_version
+            )
+            if result is None:
+                return None
+            version, updated_at = result
+            return DispatchEvent.record(dispatch_id, {
+                'type': 'echo.message',
+                'data': {
+                    'id': f'{dispatch_id}',
+                    'status': status,
+                    'version': version,
+                    'updated_at': DispatchReadSerializer.datetime_field.to_representation(
+                        updated_at
+                    ),
+                },
+                'partial': True,
+            })
+
+    @database_sync_to_async
+    def _get_missed_events(self, user, dispatch_ids, last_seq):
+        # Active dispatches, plus those the client tracked that have been
+        # completed since, as long as the user takes part in them.
+        dispatch_ids = set(dispatch_ids) | set(last_seq)
+        if not dispatch_ids:
+            return []
+        condition = Q()
+        for dispatch_id in dispatch_ids:
+            condition |= Q(
+                dispatch_id=dispatch_id, seq__gt=last_seq.get(dispatch_id, 0)
+            )
+        return list(DispatchEvent.objects.filter(condition).filter(
+            Q(dispatch__requestor_id=user.id) | Q(dispatch__contractor_id=user.id)
+        ).order_by('seq').values_list('seq', 'payload'))
+
+    def _get_connection_groups(self):
+        groups = list(self.dispatch_ids)
+        if self.user_role == 'contractor':
+            groups.append('contractors')
+            groups.append(user_group(self.scope['user'].id))
+        if self.geo_group is not None:
+            groups.append(self.geo_group)
+        return groups
+
+    def _get_scope_last_seq(self):
+        # Resuming clients pass ``last_seq=<dispatch id>:<seq>`` for each
+        # dispatch they have seen updates of; a blank ``last_seq`` resumes
+        # with no updates seen. Each one adds a condition to the replay
+        # query, so only the first MAX_RESUMED are honoured.
+        query_string = parse_qs(
+            self.scope['query_string'].decode(), keep_blank_values=True
+        )
+        if 'last_seq' not in query_string:
+            return None
+        last_seq = {}
+        max_resumed = settings.DISPATCH_EVENTS['MAX_RESUMED']
+        for value in query_string['last_seq'][:max_resumed]:
+            dispatch_id, _, seq = value.rpartition(':')
+            try:
+                last_seq[f'{uuid.UUID(dispatch_id)}'] = int(seq)
+            except ValueError:
+                continue
+        return last_seq
+
+    def _get_scope_position(self):
+        query_string = parse_qs(self.scope['query_string'].decode())
+        try:
+            latitude = float(query_string['latitude'][0])
+            longitude = float(query_string['longitude'][0])
+        except (KeyError, ValueError):
+            return None
+        if not (-90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0):
+            return None
+        return latitude, longitude
+
+    async def _notify_contractors(self, items, cache=None):
+        if settings.DISPATCH_MATCHER['ENABLED']:
+            # The matcher offers located dispatches to one contractor each.
+            located = [item for item in items if item[0].has_request_coordinates]
+            if located:
+                matcher.submit(located, self.channel_layer)
+            items = [item for item in items if not item[0].has_request_coordinates]
+        if items:
+            await self._broadcast_to_contractors(items, cache)
+
+    async def _broadcast_to_contractors(self, items, cache=None):
+        # Only contractors in the cells around the pickup are alerted at
+        # first; the search widens while nobody claims the dispatch.
+        radius = settings.DISPATCH_GEO['RADIUS']
+        await send_to_groups(
+            self.channel_layer, get_contractor_groups(items, range(radius + 1)), cache
+        )
+        items = [item for item in items if item[0].has_request_coordinates]
+        if items:
+            escalator.submit(items, radius, self.channel_layer)
+
+    async def _write(self, text_data, bytes_data):
+        if not metrics.ENABLED:
+            await super().send(text_data=text_data, bytes_data=bytes_data)
+            return
+        start = time.perf_counter()
+        await super().send(text_data=text_data, bytes_data=bytes_data)
+        metrics.send_seconds.observe(time.perf_counter() - start)
+
+    async def _close_after_write_error(self):
+        await self.close(code=self.write_error_close_code)
+
+    async def send(self, text_data=None, bytes_data=None, close=False, key=None, partial=False):
+        if self.binary and text_data is not None:
+            text_data, bytes_data = None, pack_text(text_data)
+        # Frames go through the connection's outbound queue so a slow client
+        # cannot stall the handlers relaying group messages to it.
+        if self.outbound is None or close:
+            await super().send(text_data=text_data, bytes_data=bytes_data, close=close)
+            return
+        if self.outbound.slow or self.outbound.failed:
+            return
+        if not self.outbound.put(text_data, bytes_data, key, partial):
+            await self.close(code=self.slow_consumer_close_code)
+
+    async def send_json(self, content, close=False):
+        if self.binary:
+            await self.send(bytes_data=pack(content), close=close)
+            return
+        await self.send(text_data=await self.encode_json(content), close=close)
+
+    async def receive(self, text_data=None, bytes_data=None, **kwargs):
+        if self.binary and bytes_data is not None:
+            try:
+                content = unpack(bytes_data)
+            except (TypeError, ValueError):
+                # msgpack's decoding errors are ValueErrors.
+                content = None
+            if not isinstance(content, dict):
+                await self.send_error(None, 'Frames must be MessagePack maps.')
+                return
+            await self.receive_json(content, **kwargs)
+            return
+        await super().receive(text_data=text_data, bytes_data=bytes_data, **kwargs)
+
+    async def send_error(self, message_type, detail):
+        await self.send_json({
+            'type': 'error',
+            'data': {
+                'message_type': message_type,
+                'detail': detail,
+            },
+        })
 
     async def connect(self):
         user = self.scope['user']
         if user.is_anonymous:
             await self.close()
         else:
-            user_group = await self._get_user_group(user)
-            if user_group == 'contractor':
-                await self.channel_layer.group_add(
-                    group='contractors',
-                    channel=self.channel_name
-                )
-            for dispatch_id in await self._get_dispatch_ids(user):
-                await self.channel_layer.group_add(
-                    group=dispatch_id,
-                    channel=self.channel_name
-                )
-            await self.accept()
+            # Role and active dispatches are resolved once per connection and
+            # reused by disconnect().
+            self.user_role, self.dispatch_ids = await self._get_connection_state(
+                user, self.scope.get('user_groups')
+            )
+            self.available = not self.dispatch_ids
+            if self.user_role == 'contractor':
+                contractor_index.add_connection(user.id)
+            position = self._get_scope_position()
+            if self.user_role == 'contractor' and position is not None:
+                self.geo_group = geo.contractor_group(*position)
+                contractor_index.update(user.id, *position, available=self.available)
+            await group_add_many(
+                self.channel_layer,
+                groups=self._get_connection_groups(),
+                channel=self.channel_name
+            )
+            if self.binary_subprotocol in self.scope.get('subprotocols', ()):
+                self.binary = True
+                await self.accept(subprotocol=self.binary_subprotocol)
+            else:
+                await self.accept()
+            self.outbound = OutboundQueue(
+                self._write,
+                max_size=settings.WEBSOCKET_OUTBOUND['MAX_SIZE'],
+                max_lag=settings.WEBSOCKET_OUTBOUND['MAX_LAG'],
+                on_error=self._close_after_write_error,
+            )
+            metrics.connections.inc()
+            last_seq = self._get_scope_last_seq()
+            if last_seq is not None:
+                await self._replay_events(last_seq)
+
+    async def _replay_events(self, last_seq):
+        # Group messages are only handled once connect() returns, so the
+        # missed events go out before any live update. Live updates already
+        # replayed arrive again with the same seq and clients skip them.
+        events = await self._get_missed_events(
+            self.scope['user'], self.dispatch_ids, last_seq
+        )
+        for seq, payload in events:
+            content = loads(payload)
+            content['seq'] = seq
+            await self.send(
+                text_data=dumps(content),
+                key=f"{content['data']['id']}",
+                partial=content.get('partial', False)
+            )
 
     async def create_dispatch(self, message):
         data = message.get('data')
-        dispatch = await self._create_dispatch(data)
-        dispatch_data = await self._get_dispatch_data(dispatch)
+        # One database hop validates, inserts and serializes.
+        dispatch, dispatch_data = await self._create_dispatch(data)
 
-        # Send requestor requests to all contractors
-        await self.channel_layer.group_send(group='contractors', message={
-            'type': 'echo.message',
-            'data': dispatch_data
-        })
+        cache = {}
+        message = encode_dispatches([dispatch_data], cache)
+
+        # Send requestor requests to nearby contractors
+        await self._notify_contractors([(dispatch, dispatch_data)], cache)
 
         # Add contractor to dispatch group
         await self.channel_layer.group_add(
             group=f'{dispatch.id}',
             channel=self.channel_name
         )
+        self.dispatch_ids.add(f'{dispatch.id}')
 
-        await self.send_json({
-            'type': 'echo message',
-            'data': dispatch_data,
-        })
+        await self.send(text_data=message['text'])
+
+    async def create_dispatch_batch(self, message):
+        items, errors = await self._create_dispatch_batch(message.get('data'))
+        if errors:
+            # The batch is all-or-nothing; errors line up with the items.
+            await self.send_error('create.dispatch.batch', errors)
+            return
+
+        cache = {}
+        dispatches_data = [dispatch_data for _, dispatch_data in items]
+        reply = encode_dispatches(dispatches_data, cache)
+
+        # One aggregated message per contractor group for the whole batch.
+        await self._notify_contractors(items, cache)
+
+        dispatch_ids = [f'{dispatch.id}' for dispatch, _ in items]
+        await group_add_many(
+            self.channel_layer,
+            groups=dispatch_ids,
+            channel=self.channel_name
+        )
+        self.dispatch_ids.update(dispatch_ids)
+
+        await self.send(text_data=reply['text'])
+
+    async def claim_dispatch(self, message):
+        data = message.get('data') or {}
+        try:
+            dispatch_id = uuid.UUID(f"{data.get('id')}")
+        except ValueError:
+            await self.send_error('claim.dispatch', 'Invalid dispatch ID.')
+            return
+        if self.user_role != 'contractor':
+            await self.send_error('claim.dispatch', 'Only contractors can claim dispatches.')
+            return
+
+        dispatch, content = await self._claim_dispatch(
+            dispatch_id, self.scope['user']
+        )
+        if dispatch is None:
+            await self.send_json({
+                'type': 'claim.rejected',
+                'data': {'id': f'{dispatch_id}'},
+            })
+            return
+
+        matcher.discard(dispatch_id)
+        escalator.discard(dispatch_id)
+        self._set_available(False)
+        await self._publish_update(
+            f'{dispatch_id}', encoded_message(content, key=f'{dispatch_id}')
+        )
+
+    async def decline_dispatch(self, message):
+        data = message.get('data') or {}
+        try:
+            dispatch_id = uuid.UUID(f"{data.get('id')}")
+        except ValueError:
+            await self.send_error('decline.dispatch', 'Invalid dispatch ID.')
+            return
+        if not matcher.decline(dispatch_id, self.scope['user'].id):
+            await self.send_error('decline.dispatch', 'No open offer for this dispatch.')
 
     async def update_dispatch(self, message):
-        data = message.get('data')
-        dispatch = await self._update_dispatch(data)
-        dispatch_id = f'{dispatch.id}'
-        dispatch_data = await self._get_dispatch_data(dispatch)
+        data = message.get('data') or {}
+        if 'status' in data and set(data) <= self.status_update_fields:
+            await self.update_dispatch_status(data)
+            return
+
+        try:
+            dispatch_id = uuid.UUID(f"{data.get('id')}")
+            expected_version = data.get('version')
+            if expected_version is not None:
+                expected_version = int(expected_version)
+        except (TypeError, ValueError):
+            await self.send_error('update.dispatch', 'Invalid dispatch ID or version.')
+            return
+        dispatch, content, delta, error = await self._update_dispatch(
+            dispatch_id, data, expected_version
+        )
+        if error:
+            await self.send_error('update.dispatch', error)
+            return
+        if dispatch.contractor_id == self.scope['user'].id:
+            self._set_available(dispatch.status == Dispatch.COMPLETED)
+        await self._publish_update(
+            f'{dispatch.id}', encoded_message(content, key=f'{dispatch.id}', delta=delta),
+            completed=dispatch.status == Dispatch.COMPLETED
+        )
+
+    async def update_dispatch_status(self, data):
+        # Status pings from the assigned contractor skip the read and the full
+        # serializer: the transition is checked in memory and enforced by a
+        # single narrow UPDATE.
+        status = data['status']
+        try:
+            dispatch_id = uuid.UUID(f"{data.get('id')}")
+            expected_version = data.get('version')
+            if expected_version is not None:
+                expected_version = int(expected_version)
+        except (TypeError, ValueError):
+            await self.send_error('update.dispatch', 'Invalid dispatch ID or version.')
+            return
+        if status not in Dispatch.TRANSITION_SOURCES:
+            await self.send_error('update.dispatch', f'Unknown status {status}.')
+            return
+        if self.user_role != 'contractor':
+            await self.send_error(
+                'update.dispatch', 'Only the assigned contractor can send status updates.'
+            )
+            return
+        content = await self._update_dispatch_status(
+            dispatch_id, status, self.scope['user'].id, expected_version
+        )
+        if content is None:
+            await self.send_error(
+                'update.dispatch',
+                f'Dispatch cannot move to {status} from its current status or '
+                f'version, or is not assigned to you.'
+            )
+            return
+
+        self._set_available(status == Dispatch.COMPLETED)
+        await self._publish_update(
+            f'{dispatch_id}', encoded_message(content, key=f'{dispatch_id}'),
+            completed=status == Dispatch.COMPLETED
+        )
+
+    def _set_available(self, available):
+        # Contractors drop out of nearest-contractor matching while working a
+        # dispatch and come back once they complete one.
+        self.available = available
+        if self.user_role == 'contractor':
+            contractor_index.set_available(self.scope['user'].id, available)
+
+    async def _publish_update(self, dispatch_id, message, completed=False):
+        if completed:
+            # Every member leaves the group once it has relayed this update.
+            message['completed'] = True
 
         # Send update to requestor
         await self.channel_layer.group_send(
             group=dispatch_id,
-            message={
-                'type': 'echo.message',
-                'data': dispatch_data,
-            }
+            message=message
         )
 
-        # Add driver to the trip group.
-        await self.channel_layer.group_add(
-            group=dispatch_id,
-            channel=self.channel_name
-        )
+        # Add driver to the trip group while the trip is on.
+        if completed:
+            await self._leave_dispatch(dispatch_id)
+        elif dispatch_id not in self.dispatch_ids:
+            await self.channel_layer.group_add(
+                group=dispatch_id,
+                channel=self.channel_name
+            )
+            self.dispatch_ids.add(dispatch_id)
 
-        await self.send_json({
-            'type': 'echo.message',
-            'data': dispatch_data
-        })
+        await self.send(text_data=self._get_frame(message)[0])
+
+    async def _leave_dispatch(self, dispatch_id):
+        # Completed dispatches get no further updates or contractor locations.
+        if dispatch_id in self.dispatch_ids:
+            self.dispatch_ids.discard(dispatch_id)
+            await self.channel_layer.group_discard(
+                group=dispatch_id,
+                channel=self.channel_name
+            )
+
+    async def update_location(self, message):
+        data = message.get('data') or {}
+        try:
+            latitude = float(data['latitude'])
+            longitude = float(data['longitude'])
+        except (KeyError, TypeError, ValueError):
+            await self.send_error('location.update', 'Invalid coordinates.')
+            return
+        if not (-90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0):
+            await self.send_error('location.update', 'Invalid coordinates.')
+            return
+        if self.user_role != 'contractor':
+            await self.send_error('location.update', 'Only contractors can stream locations.')
+            return
+
+        # Memory only; the store persists positions in batches.
+        user_id = self.scope['user'].id
+        position_store.update(user_id, latitude, longitude)
+        contractor_index.update(user_id, latitude, longitude, available=self.available)
 
+        geo_group = geo.contractor_group(latitude, longitude)
+        if geo_group != self.geo_group:
+            if self.geo_group is not None:
+                await self.channel_layer.group_discard(
+                    group=self.geo_group,
+                    channel=self.channel_name
+                )
+            await self.channel_layer.group_add(
+                group=geo_group,
+                channel=self.channel_name
+            )
+            self.geo_group = geo_group
+
+        # Coalesce: at most one rebroadcast per interval carries the latest
+        # position received by then.
+        if self._location_task is None or self._location_task.done():
+            delay = max(
+                0.0,
+                self._last_location_broadcast
+                + settings.LOCATION_STREAM['BROADCAST_INTERVAL']
+                - time.monotonic()
+            )
+            self._location_task = asyncio.create_task(
+                self._broadcast_location(delay)
+            )
+
+    async def _broadcast_location(self, delay):
+        await asyncio.sleep(delay)
+        self._last_location_broadcast = time.monotonic()
+        user_id = self.scope['user'].id
+        position = position_store.get(user_id)
+        if position is None or not self.dispatch_ids:
+            return
+        message = encoded_message({
+            'type': 'location.message',
+            'data': {
+                'contractor': user_id,
+                'latitude': position.latitude,
+                'longitude': position.longitude,
+                'recorded_at': position.recorded_at,
+            },
+        }, key=f'location.{user_id}')
+        await group_send_many(self.channel_layer, self.dispatch_ids, message)
 
     async def disconnect(self, code):
+        if self._location_task is not None:
+            self._location_task.cancel()
+        if self.outbound is not None:
+            self.outbound.close()
+            metrics.connections.dec()
+        if self.user_role == 'contractor':
+            contractor_index.remove_connection(self.scope['user'].id)
         user = self.scope['user']
         if user.is_anonymous:
             await self.close()
         else:
-            user_group = await self._get_user_group(user)
-            if user_group == 'contractor':
-                await self.channel_layer.group_discard(
-                    group='contractors',
-                    channel=self.channel_name
-                )
-            for dispatch_id in await self._get_dispatch_ids(user):
-                await self.channel_layer.group_discard(
-                    group=dispatch_id,
-                    channel=self.channel_name
-                )
+            await group_discard_many(
+                self.channel_layer,
+                groups=self._get_connection_groups(),
+                channel=self.channel_name
+            )
         await super().disconnect(code)
 
     async def echo_message(self, message):
         await self.send_json(message)
 
+    def _get_frame(self, message):
+        # Binary clients get the delta, if any, without coalescing: queued
+        # deltas of one dispatch carry different fields.
+        if self.binary and 'delta' in message:
+            return message['delta'], None, False
+        return message['text'], message.get('key'), message.get('partial', False)
+
+    async def echo_encoded(self, message):
+        if self.geo_group is not None and self.geo_group in message.get('skip_groups', ()):
+            # Already alerted through its geohash cell.
+            return
+        text_data, key, partial = self._get_frame(message)
+        await self.send(text_data=text_data, key=key, partial=partial)
+        if message.get('completed'):
+            await self._leave_dispatch(message['key'])
+
+    @classmethod
+    async def decode_json(cls, text_data):
+        return loads(text_data)
+
+    @classmethod
+    async def encode_json(cls, content):
+        return dumps(content)
+
+    def _refuse(self, message_type):
+        # Checked before any database hop; returns (reason, detail) when the
+        # message must be dropped.
+        if not self.rate_limiter.allow(None, message_type):
+            return 'rate_limited', 'Rate limit exceeded for this connection.'
+        if not user_limiter.allow(self.scope['user'].id, message_type):
+            return 'rate_limited', 'Rate limit exceeded for this user.'
+        if message_type in self.database_message_types and not admission.admit():
+            return 'overloaded', 'Server is busy, try again later.'
+        return None
+
     async def receive_json(self, content, **kwargs):
         message_type = content.get('type')
+        if message_type in self.message_types:
+            refusal = self._refuse(message_type)
+            if refusal is not None:
+                reason, detail = refusal
+                if metrics.ENABLED:
+                    rejected_messages.inc(message_type, reason)
+                await self.send_error(message_type, detail)
+                return
+        if not metrics.ENABLED:
+            await self._route(message_type, content)
+            return
+        label = message_type if message_type in self.message_types else 'unknown'
+        with metrics.track_message(label):
+            await self._route(message_type, content)
+
+    async def _route(self, message_type, content):
         if message_type == 'create.dispatch':
             await self.create_dispatch(content)
+        elif message_type == 'create.dispatch.batch':
+            await self.create_dispatch_batch(content)
         elif message_type == 'echo.message':
             await self.echo_message(content)
         elif message_type == 'update.dispatch':
             await self.update_dispatch(content)
+        elif message_type == 'claim.dispatch':
+            await self.claim_dispatch(content)
+        elif message_type == 'decline.dispatch':
+            await self.decline_dispatch(content)
+        elif message_type == 'location.update':
+            await self.update_location(content)
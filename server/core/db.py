@@ -0,0 +1,83 @@
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from channels.db import DatabaseSyncToAsync as BaseDatabaseSyncToAsync
+from django.conf import settings
+
+from core import metrics
+
+
+_executor = None
+_pending = 0
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.DATABASE_THREAD_POOL_SIZE,
+            thread_name_prefix='database',
+        )
+    return _executor
+
+
+def get_pending():
+    # Calls submitted from async code that have not finished, queued or
+    # running; read by core.throttling to shed load.
+    return _pending
+
+
+def set_pool_size(size):
+    # Swap in a pool of another size, e.g. for benchmarks; calls already
+    # running finish on the old pool.
+    global _executor
+    executor, _executor = _executor, ThreadPoolExecutor(
+        max_workers=size, thread_name_prefix='database'
+    )
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+class DatabaseSyncToAsync(BaseDatabaseSyncToAsync):
+    """
+    channels' database_sync_to_async without thread sensitivity.
+
+    Thread-sensitive calls all run on one shared thread, so every consumer's
+    queries wait in a single line. These run on a dedicated pool of
+    DATABASE_THREAD_POOL_SIZE threads, each holding its own database
+    connection, and queries from different connections proceed in parallel.
+    A call still runs start to finish on one thread, so transactions inside
+    it behave as before.
+    """
+
+    def __init__(self, func):
+        super().__init__(func, thread_sensitive=False)
+
+    async def __call__(self, *args, **kwargs):
+        global _pending
+        self._executor = get_executor()
+        _pending += 1
+        try:
+            if not metrics.ENABLED:
+                return await super().__call__(*args, **kwargs)
+            timed = BaseDatabaseSyncToAsync(
+                functools.partial(run_timed, time.perf_counter(), self.func),
+                thread_sensitive=False,
+                executor=self._executor,
+            )
+            return await timed(*args, **kwargs)
+        finally:
+            _pending -= 1
+
+
+def run_timed(submitted_at, func, *args, **kwargs):
+    started_at = time.perf_counter()
+    metrics.database_wait_seconds.observe(started_at - submitted_at)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        metrics.database_call_seconds.observe(time.perf_counter() - started_at)
+
+
+database_sync_to_async = DatabaseSyncToAsync
@@ -0,0 +1,56 @@
+import functools
+import json
+
+import msgpack
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(content):
+    if orjson is not None:
+        return orjson.dumps(content).decode()
+    return json.dumps(content)
+
+
+def loads(text):
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def pack(content):
+    return msgpack.packb(content, use_bin_type=True)
+
+
+def unpack(data):
+    return msgpack.unpackb(data, raw=False)
+
+
+@functools.lru_cache(maxsize=256)
+def pack_text(text):
+    # MessagePack form of a JSON frame. Group messages reach every binary
+    # client in the process with the same text, so each is converted once.
+    return pack(loads(text))
+
+
+def encoded_message(content, key=None, delta=None):
+    # Channel-layer message carrying a payload that was JSON-encoded once by
+    # the sender; DispatchConsumer.echo_encoded relays the text verbatim.
+    # Receivers may coalesce queued messages with the same key (see
+    # core.outbound), so only the latest state of that key is delivered.
+    # ``delta`` is a partial payload with only the changed fields, sent
+    # instead of ``content`` to clients that negotiated the binary protocol.
+    message = {
+        'type': 'echo.encoded',
+        'text': dumps(content),
+    }
+    if key is not None:
+        message['key'] = key
+        if content.get('partial'):
+            message['partial'] = True
+    if delta is not None:
+        message['delta'] = dumps(delta)
+    return message
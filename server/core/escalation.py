@@ -0,0 +1,126 @@
+import asyncio
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+from core import geo
+from core.broadcasts import get_contractor_groups, send_to_groups
+from core.encoding import encoded_message
+from core.matching import get_unclaimed_ids
+
+
+Escalation = namedtuple('Escalation', 'dispatch dispatch_data radius due_at')
+
+
+class Escalator:
+    """
+    Widens the broadcast of unclaimed dispatches by one geohash ring every
+    ``delay`` seconds up to ``max_radius``, then falls back to the global
+    'contractors' group.
+
+    The fallback carries the ring groups already alerted as ``skip_groups``
+    so contractors in them are not sent the dispatch twice. One task per
+    process drives every escalation, so it carries on after the requesting
+    client disconnects.
+    """
+
+    def __init__(self, max_radius, delay):
+        self.max_radius = max_radius
+        self.delay = delay
+        self._pending = {}
+        self._channel_layer = None
+        self._task = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def submit(self, items, radius, channel_layer):
+        # ``items`` are (dispatch, dispatch_data) already sent to the rings
+        # up to ``radius``.
+        due_at = time.monotonic() + self.delay
+        for dispatch, dispatch_data in items:
+            self._pending[dispatch.id] = Escalation(dispatch, dispatch_data, radius, due_at)
+        self._channel_layer = channel_layer
+        # A task left on another event loop, e.g. by an earlier asyncio.run(),
+        # would never run again.
+        if (
+            self._task is None
+            or self._task.done()
+            or self._task.get_loop() is not asyncio.get_running_loop()
+        ):
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while self._pending:
+            due_at = min(escalation.due_at for escalation in self._pending.values())
+            await asyncio.sleep(max(0.0, due_at - time.monotonic()))
+            await self.run_round()
+
+    def discard(self, dispatch_id):
+        self._pending.pop(dispatch_id, None)
+
+    def clear(self):
+        if self._task is not None:
+            self._task.cancel()
+        self._pending.clear()
+
+    def get_skip_groups(self, dispatch):
+        return [
+            group
+            for radius in range(self.max_radius + 1)
+            for group in geo.ring_groups(
+                dispatch.request_latitude, dispatch.request_longitude, radius
+            )
+        ]
+
+    async def run_round(self, now=None):
+        now = time.monotonic() if now is None else now
+        due = [
+            escalation for escalation in self._pending.values()
+            if escalation.due_at <= now
+        ]
+        if not due:
+            return
+        unclaimed_ids = await get_unclaimed_ids([
+            escalation.dispatch.id for escalation in due
+        ])
+        rings = {}
+        fallback = []
+        for escalation in due:
+            dispatch_id = escalation.dispatch.id
+            if dispatch_id not in self._pending:
+                continue
+            if dispatch_id not in unclaimed_ids or escalation.radius >= self.max_radius:
+                # Claimed, or nobody in range accepted.
+                self.discard(dispatch_id)
+                if dispatch_id in unclaimed_ids:
+                    fallback.append(escalation)
+                continue
+            radius = escalation.radius + 1
+            self._pending[dispatch_id] = escalation._replace(
+                radius=radius, due_at=now + self.delay
+            )
+            rings.setdefault(radius, []).append(
+                (escalation.dispatch, escalation.dispatch_data)
+            )
+
+        groups = {}
+        for radius, items in rings.items():
+            for group, dispatches_data in get_contractor_groups(items, [radius]).items():
+                groups.setdefault(group, []).extend(dispatches_data)
+        sends = [send_to_groups(self._channel_layer, groups)] if groups else []
+        for escalation in fallback:
+            message = encoded_message({
+                'type': 'echo.message',
+                'data': escalation.dispatch_data,
+            }, key=f'{escalation.dispatch.id}')
+            message['skip_groups'] = self.get_skip_groups(escalation.dispatch)
+            sends.append(self._channel_layer.group_send('contractors', message))
+        await asyncio.gather(*sends)
+
+
+escalator = Escalator(
+    max_radius=settings.DISPATCH_GEO['MAX_RADIUS'],
+    delay=settings.DISPATCH_GEO['ESCALATION_DELAY'],
+)
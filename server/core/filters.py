@@ -0,0 +1,40 @@
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+class DispatchFilterBackend(BaseFilterBackend):
+    """
+    Filters dispatches by ``status`` (repeatable), ``requestor``,
+    ``contractor``, ``created_after`` and ``created_before``.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        statuses = params.getlist('status')
+        if statuses:
+            queryset = queryset.filter(status__in=statuses)
+        for name in ('requestor', 'contractor'):
+            value = params.get(name)
+            if value:
+                if not value.isdigit():
+                    raise ValidationError({name: 'Must be a user ID.'})
+                queryset = queryset.filter(**{f'{name}_id': int(value)})
+        for name, lookup in (
+            ('created_after', 'created_at__gte'),
+            ('created_before', 'created_at__lt'),
+        ):
+            value = params.get(name)
+            if value:
+                try:
+                    # ValueError: well formed but out of range, e.g. month 13.
+                    created_at = parse_datetime(value)
+                except ValueError:
+                    created_at = None
+                if created_at is None:
+                    raise ValidationError({name: 'Must be an ISO 8601 datetime.'})
+                if timezone.is_naive(created_at):
+                    created_at = timezone.make_aware(created_at)
+                queryset = queryset.filter(**{lookup: created_at})
+        return queryset
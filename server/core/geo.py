@@ -0,0 +1,77 @@
+import math
+
+from django.conf import settings
+
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode(latitude, longitude, precision):
+    latitude_range = [-90.0, 90.0]
+    longitude_range = [-180.0, 180.0]
+    geohash = []
+    bits = bit_count = 0
+    even = True
+    while len(geohash) < precision:
+        if even:
+            value_range, value = longitude_range, longitude
+        else:
+            value_range, value = latitude_range, latitude
+        middle = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(BASE32[bits])
+            bits = bit_count = 0
+    return ''.join(geohash)
+
+
+def cell_size(precision):
+    # Geohash bits alternate longitude/latitude, starting with longitude.
+    latitude_bits = precision * 5 // 2
+    longitude_bits = precision * 5 - latitude_bits
+    return 180.0 / 2 ** latitude_bits, 360.0 / 2 ** longitude_bits
+
+
+def ring(latitude, longitude, radius, precision):
+    """
+    Geohash cells at Chebyshev distance ``radius`` from the cell containing
+    the given point; radius 0 is the cell itself.
+    """
+    height, width = cell_size(precision)
+    center_latitude = (math.floor((latitude + 90.0) / height) + 0.5) * height - 90.0
+    center_longitude = (math.floor((longitude + 180.0) / width) + 0.5) * width - 180.0
+    cells = set()
+    for dy in range(-radius, radius + 1):
+        cell_latitude = center_latitude + dy * height
+        if not -90.0 < cell_latitude < 90.0:
+            continue
+        for dx in range(-radius, radius + 1):
+            if max(abs(dx), abs(dy)) != radius:
+                continue
+            cell_longitude = (center_longitude + dx * width + 180.0) % 360.0 - 180.0
+            cells.add(encode(cell_latitude, cell_longitude, precision))
+    return cells
+
+
+def cell_group(geohash):
+    return f'geo.{geohash}'
+
+
+def contractor_group(latitude, longitude):
+    precision = settings.DISPATCH_GEO['PRECISION']
+    return cell_group(encode(latitude, longitude, precision))
+
+
+def ring_groups(latitude, longitude, radius):
+    precision = settings.DISPATCH_GEO['PRECISION']
+    return [
+        cell_group(geohash)
+        for geohash in sorted(ring(latitude, longitude, radius, precision))
+    ]
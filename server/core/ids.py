@@ -0,0 +1,46 @@
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+
+_lock = threading.Lock()
+_last_timestamp = 0
+_counter = 0
+
+
+def uuid7():
+    """
+    Time-ordered UUID (RFC 9562 version 7): a 48-bit Unix millisecond
+    timestamp, a 12-bit counter keeping IDs monotonic within a millisecond in
+    this process, and 62 random bits.
+    """
+    global _last_timestamp, _counter
+    with _lock:
+        timestamp = time.time_ns() // 1_000_000
+        if timestamp <= _last_timestamp:
+            timestamp = _last_timestamp
+            _counter += 1
+            if _counter > 0xFFF:
+                timestamp += 1
+                _counter = 0
+        else:
+            _counter = 0
+        _last_timestamp = timestamp
+        counter = _counter
+    random_bits = int.from_bytes(os.urandom(8), 'big') & (2 ** 62 - 1)
+    return uuid.UUID(int=(
+        timestamp << 80
+        | 0x7 << 76
+        | counter << 64
+        | 0b10 << 62
+        | random_bits
+    ))
+
+
+def generate_dispatch_id():
+    if settings.DISPATCH_ID_VERSION == 4:
+        return uuid.uuid4()
+    return uuid7()
@@ -0,0 +1,278 @@
+import asyncio
+import time
+import uuid
+from collections import deque
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer, get_channel_layer
+from channels_redis.core import RedisChannelLayer as BaseRedisChannelLayer
+
+from core import metrics
+
+
+class RedisChannelLayer(BaseRedisChannelLayer):
+    """
+    Redis channel layer that can change many group memberships of a channel
+    in one pipelined round-trip per shard.
+    """
+
+    async def group_add_many(self, groups, channel):
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+        timestamp = time.time()
+
+        async def add(index, group_keys):
+            async with self.connection(index) as connection:
+                pipeline = connection.pipeline()
+                for group_key in group_keys:
+                    pipeline.zadd(group_key, timestamp, channel)
+                    pipeline.expire(group_key, self.group_expiry)
+                await pipeline.execute()
+
+        await asyncio.gather(*(
+            add(index, group_keys)
+            for index, group_keys in self._group_keys_by_shard(groups).items()
+        ))
+
+    async def group_discard_many(self, groups, channel):
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+
+        async def discard(index, group_keys):
+            async with self.connection(index) as connection:
+                pipeline = connection.pipeline()
+                for group_key in group_keys:
+                    pipeline.zrem(group_key, channel)
+                await pipeline.execute()
+
+        await asyncio.gather(*(
+            discard(index, group_keys)
+            for index, group_keys in self._group_keys_by_shard(groups).items()
+        ))
+
+    def _group_keys_by_shard(self, groups):
+        shards = {}
+        for group in groups:
+            assert self.valid_group_name(group), 'Group name not valid'
+            shards.setdefault(self.consistent_hash(group), []).append(
+                self._group_key(group)
+            )
+        return shards
+
+
+class ChannelQueue:
+    __slots__ = ('capacity', 'messages', 'waiter')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.messages = deque()
+        self.waiter = None
+
+
+class LocalChannelLayer(BaseChannelLayer):
+    """
+    Channel layer that keeps channels and groups in the memory of one process,
+    for single-node deployments without Redis.
+
+    Each channel has a bounded queue: ``send`` raises ChannelFull and
+    ``group_send`` drops the message for a full channel. Messages older than
+    ``expiry`` seconds are dropped, and group memberships lapse after
+    ``group_expiry`` seconds like on Redis. A group send puts the same
+    message object on every member's queue, so receivers must not mutate
+    messages. ``stats`` counts sent, received, dropped and expired messages.
+    """
+
+    extensions = ['groups', 'flush']
+
+    def __init__(
+        self, expiry=60, group_expiry=86400, capacity=100,
+        channel_capacity=None, **kwargs
+    ):
+        super().__init__(expiry=expiry, capacity=capacity, **kwargs)
+        self.channel_capacity = self.compile_capacities(channel_capacity or {})
+        self.group_expiry = group_expiry
+        self.channels = {}
+        self.groups = {}
+        self.stats = {
+            'sent': 0,
+            'received': 0,
+            'dropped': 0,
+            'expired': 0,
+        }
+        self._next_sweep = time.monotonic() + expiry
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            'channels': len(self.channels),
+            'groups': len(self.groups),
+            'queued': sum(len(queue.messages) for queue in self.channels.values()),
+        }
+
+    def _get_queue(self, channel):
+        queue = self.channels.get(channel)
+        if queue is None:
+            queue = self.channels[channel] = ChannelQueue(self.get_capacity(channel))
+        return queue
+
+    def _put(self, channel, message, now):
+        queue = self._get_queue(channel)
+        if len(queue.messages) >= queue.capacity:
+            self._drop_expired(queue, now)
+            if len(queue.messages) >= queue.capacity:
+                self.stats['dropped'] += 1
+                return False
+        queue.messages.append((now + self.expiry, message))
+        self.stats['sent'] += 1
+        if queue.waiter is not None and not queue.waiter.done():
+            queue.waiter.set_result(None)
+        return True
+
+    def _drop_expired(self, queue, now):
+        messages = queue.messages
+        while messages and messages[0][0] <= now:
+            messages.popleft()
+            self.stats['expired'] += 1
+
+    def _sweep(self, now):
+        # Expire messages left on channels nobody reads any more, and group
+        # memberships that were never discarded.
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.expiry
+        for channel, queue in list(self.channels.items()):
+            self._drop_expired(queue, now)
+            if not queue.messages and queue.waiter is None:
+                del self.channels[channel]
+        joined_before = now - self.group_expiry
+        for group, members in list(self.groups.items()):
+            for channel, joined_at in list(members.items()):
+                if joined_at < joined_before:
+                    del members[channel]
+            if not members:
+                del self.groups[group]
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+        now = time.monotonic()
+        self._sweep(now)
+        if not self._put(channel, message, now):
+            raise ChannelFull(channel)
+
+    async def receive(self, channel):
+        assert self.valid_channel_name(channel)
+        # Queues left empty by receivers that went away are removed by the
+        # next sweep.
+        queue = self._get_queue(channel)
+        while True:
+            self._drop_expired(queue, time.monotonic())
+            if queue.messages:
+                self.stats['received'] += 1
+                return queue.messages.popleft()[1]
+            queue.waiter = asyncio.get_running_loop().create_future()
+            try:
+                await queue.waiter
+            finally:
+                queue.waiter = None
+
+    async def new_channel(self, prefix='specific.'):
+        return f'{prefix}.local!{uuid.uuid4().hex}'
+
+    async def flush(self):
+        self.channels = {}
+        self.groups = {}
+
+    async def close(self):
+        pass
+
+    async def group_add(self, group, channel):
+        await self.group_add_many([group], channel)
+
+    async def group_add_many(self, groups, channel):
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+        now = time.monotonic()
+        for group in groups:
+            assert self.valid_group_name(group), 'Group name not valid'
+            self.groups.setdefault(group, {})[channel] = now
+
+    async def group_discard(self, group, channel):
+        await self.group_discard_many([group], channel)
+
+    async def group_discard_many(self, groups, channel):
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+        for group in groups:
+            assert self.valid_group_name(group), 'Group name not valid'
+            members = self.groups.get(group)
+            if members is None:
+                continue
+            members.pop(channel, None)
+            if not members:
+                del self.groups[group]
+
+    async def group_send(self, group, message):
+        await self.group_send_many([group], message)
+
+    async def group_send_many(self, groups, message):
+        assert isinstance(message, dict), 'Message is not a dict'
+        now = time.monotonic()
+        self._sweep(now)
+        for group in groups:
+            assert self.valid_group_name(group), 'Group name not valid'
+            for channel in list(self.groups.get(group, ())):
+                self._put(channel, message, now)
+
+
+async def group_add_many(channel_layer, groups, channel):
+    groups = list(groups)
+    if not groups:
+        return
+    if hasattr(channel_layer, 'group_add_many'):
+        await channel_layer.group_add_many(groups, channel)
+    else:
+        # Layers without a bulk API, e.g. InMemoryChannelLayer.
+        await asyncio.gather(*(
+            channel_layer.group_add(group, channel) for group in groups
+        ))
+
+
+async def group_discard_many(channel_layer, groups, channel):
+    groups = list(groups)
+    if not groups:
+        return
+    if hasattr(channel_layer, 'group_discard_many'):
+        await channel_layer.group_discard_many(groups, channel)
+    else:
+        await asyncio.gather(*(
+            channel_layer.group_discard(group, channel) for group in groups
+        ))
+
+
+async def group_send_many(channel_layer, groups, message):
+    if metrics.ENABLED:
+        groups = list(groups)
+        metrics.group_fan_out.observe(len(groups))
+    if hasattr(channel_layer, 'group_send_many'):
+        await channel_layer.group_send_many(list(groups), message)
+        return
+    await asyncio.gather(*(
+        channel_layer.group_send(group, message) for group in groups
+    ))
+
+
+def get_layer_stats(*names):
+    # Layers without statistics, e.g. channels_redis, report nothing.
+    channel_layer = get_channel_layer()
+    if not hasattr(channel_layer, 'get_stats'):
+        return {}
+    stats = channel_layer.get_stats()
+    return {(name,): stats[name] for name in names}
+
+
+metrics.registry.collect(
+    'channel_layer_messages_total', 'Messages handled by the local channel layer.',
+    lambda: get_layer_stats('sent', 'received', 'dropped', 'expired'),
+    kind='counter', labels=('event',)
+)
+metrics.registry.collect(
+    'channel_layer_queued_messages', 'Messages waiting in local channel layer queues.',
+    lambda: get_layer_stats('queued').get(('queued',), 0)
+)
@@ -0,0 +1,157 @@
+import asyncio
+import time
+
+from channels.testing import HttpCommunicator, WebsocketCommunicator
+
+from core.benchmarks import percentile
+
+
+def summarize(latencies, elapsed):
+    return {
+        'count': len(latencies),
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def find_regressions(results, baseline, tolerance):
+    """
+    Scenarios whose p99 latency grew or whose throughput fell by more than
+    ``tolerance`` (a fraction) against the baseline.
+    """
+    regressions = []
+    for scenario, result in results.items():
+        expected = baseline.get(scenario)
+        if expected is None:
+            continue
+        if result['p99_ms'] > expected['p99_ms'] * (1 + tolerance):
+            regressions.append(
+                f"{scenario}: p99 {result['p99_ms']:.1f} ms > baseline {expected['p99_ms']:.1f} ms"
+            )
+        if result['throughput'] < expected['throughput'] * (1 - tolerance):
+            regressions.append(
+                f"{scenario}: {result['throughput']:.0f}/s < baseline {expected['throughput']:.0f}/s"
+            )
+    return regressions
+
+
+class LoadTest:
+    """
+    Drives simulated requestors and contractors against the ASGI application
+    in-process, at most ``concurrency`` operations at a time.
+    """
+
+    def __init__(self, application, concurrency):
+        self.application = application
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.requestors = []
+        self.contractors = []
+
+    async def _timed(self, coroutine, latencies):
+        async with self.semaphore:
+            start = time.perf_counter()
+            result = await coroutine
+            latencies.append(time.perf_counter() - start)
+            return result
+
+    async def _connect(self, token):
+        communicator = WebsocketCommunicator(
+            application=self.application,
+            path=f'/dispatch/?token={token}'
+        )
+        connected, _ = await communicator.connect(timeout=30)
+        if not connected:
+            raise RuntimeError('WebSocket handshake was rejected.')
+        return communicator
+
+    async def handshake(self, requestor_tokens, contractor_tokens):
+        latencies = []
+        start = time.perf_counter()
+        self.requestors = await asyncio.gather(*(
+            self._timed(self._connect(token), latencies)
+            for token in requestor_tokens
+        ))
+        self.contractors = await asyncio.gather(*(
+            self._timed(self._connect(token), latencies)
+            for token in contractor_tokens
+        ))
+        return summarize(latencies, time.perf_counter() - start)
+
+    async def _create(self, communicator, user_id):
+        await communicator.send_json_to({
+            'type': 'create.dispatch',
+            'data': {
+                'request_location': f'{time.perf_counter()!r}',
+                'destination': 'Load Test Road',
+                'requestor': user_id,
+            },
+        })
+        return await communicator.receive_json_from(timeout=30)
+
+    async def create_dispatches(self, requestor_ids, per_requestor):
+        # Each requestor sends its dispatches one after another.
+        latencies = []
+
+        async def create(communicator, user_id):
+            for _ in range(per_requestor):
+                await self._timed(self._create(communicator, user_id), latencies)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            create(communicator, user_id)
+            for communicator, user_id in zip(self.requestors, requestor_ids)
+        ))
+        return summarize(latencies, time.perf_counter() - start)
+
+    async def _receive_broadcasts(self, communicator, count, latencies):
+        # request_location carries the sender's perf_counter() timestamp.
+        for _ in range(count):
+            response = await communicator.receive_json_from(timeout=60)
+            latencies.append(
+                time.perf_counter() - float(response['data']['request_location'])
+            )
+
+    async def fan_out(self, requestor_ids, per_requestor):
+        """
+        Delivery latency of create.dispatch broadcasts to every contractor,
+        measured while the dispatches are created.
+        """
+        latencies = []
+        count = len(requestor_ids) * per_requestor
+        start = time.perf_counter()
+        receivers = asyncio.gather(*(
+            self._receive_broadcasts(communicator, count, latencies)
+            for communicator in self.contractors
+        ))
+        created = await self.create_dispatches(requestor_ids, per_requestor)
+        await receivers
+        return created, summarize(latencies, time.perf_counter() - start)
+
+    async def _get(self, path, token):
+        communicator = HttpCommunicator(
+            self.application, 'GET', path,
+            headers=[
+                (b'host', b'localhost'),
+                (b'authorization', f'Bearer {token}'.encode()),
+            ]
+        )
+        response = await communicator.get_response(timeout=30)
+        if response['status'] != 200:
+            raise RuntimeError(f"GET {path} returned {response['status']}.")
+        return response
+
+    async def list_dispatches(self, tokens, requests):
+        latencies = []
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            self._timed(self._get('/api/dispatch/', tokens[index % len(tokens)]), latencies)
+            for index in range(requests)
+        ))
+        return summarize(latencies, time.perf_counter() - start)
+
+    async def close(self):
+        await asyncio.gather(*(
+            communicator.disconnect()
+            for communicator in self.requestors + self.contractors
+        ))
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+from core import metrics
+from core.db import database_sync_to_async
+from core.models import ContractorLocation
+
+
+logger = logging.getLogger(__name__)
+
+Position = namedtuple('Position', ('latitude', 'longitude', 'recorded_at'))
+
+
+class PositionStore:
+    """
+    Bounded, in-memory latest position per contractor.
+
+    Updates only touch memory; changed positions are written to
+    ContractorLocation in batches by a flush scheduled at most once per
+    ``persist_interval`` seconds.
+    """
+
+    def __init__(self, max_size, persist_interval):
+        self.max_size = max_size
+        self.persist_interval = persist_interval
+        self._positions = OrderedDict()
+        self._dirty = set()
+        self._flush_task = None
+
+    def __len__(self):
+        return len(self._positions)
+
+    def get(self, contractor_id):
+        return self._positions.get(contractor_id)
+
+    def update(self, contractor_id, latitude, longitude):
+        position = Position(latitude, longitude, time.time())
+        self._positions[contractor_id] = position
+        self._positions.move_to_end(contractor_id)
+        while len(self._positions) > self.max_size:
+            evicted_id, _ = self._positions.popitem(last=False)
+            self._dirty.discard(evicted_id)
+        self._dirty.add(contractor_id)
+        self._schedule_flush()
+        return position
+
+    def _schedule_flush(self):
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.persist_interval)
+        try:
+            await self.flush()
+        except Exception:
+            # The positions stay dirty and go out with the next flush.
+            logger.exception('Could not persist contractor positions.')
+
+    async def flush(self):
+        positions = {
+            contractor_id: self._positions[contractor_id]
+            for contractor_id in self._dirty
+            if contractor_id in self._positions
+        }
+        self._dirty.clear()
+        if not positions:
+            return
+        try:
+            await persist_positions(positions)
+        except Exception:
+            self._dirty.update(
+                contractor_id for contractor_id in positions
+                if contractor_id in self._positions
+            )
+            raise
+
+
+@database_sync_to_async
+def persist_positions(positions):
+    locations = [
+        ContractorLocation(
+            contractor_id=contractor_id,
+            latitude=position.latitude,
+            longitude=position.longitude,
+            recorded_at=datetime.fromtimestamp(
+                position.recorded_at, tz=timezone.utc
+            ),
+        )
+        for contractor_id, position in positions.items()
+    ]
+    existing_ids = set(ContractorLocation.objects.filter(
+        contractor_id__in=positions
+    ).values_list('contractor_id', flat=True))
+    ContractorLocation.objects.bulk_update(
+        [location for location in locations if location.contractor_id in existing_ids],
+        ('latitude', 'longitude', 'recorded_at'),
+    )
+    ContractorLocation.objects.bulk_create(
+        [location for location in locations if location.contractor_id not in existing_ids],
+        ignore_conflicts=True,
+    )
+
+
+position_store = PositionStore(
+    max_size=settings.LOCATION_STREAM['MAX_POSITIONS'],
+    persist_interval=settings.LOCATION_STREAM['PERSIST_INTERVAL'],
+)
+metrics.registry.collect(
+    'contractor_positions', 'Contractor positions held in memory.',
+    lambda: len(position_store)
+)
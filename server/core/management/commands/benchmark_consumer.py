@@ -0,0 +1,94 @@
+import asyncio
+import contextlib
+import time
+
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core import db
+from core.benchmarks import (
+    create_fixture_users, percentile, stock_database_sync_to_async, unthrottled,
+)
+from core.models import Dispatch
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure create.dispatch messages per second through DispatchConsumer '
+        "with channels' thread-sensitive database_sync_to_async and with "
+        'core.db at several database thread pool sizes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pool-sizes', type=int, nargs='+', default=[1, 4, 16])
+        parser.add_argument('--clients', type=int, default=50)
+        parser.add_argument('--messages', type=int, default=20, help='Messages sent by each client.')
+        parser.add_argument(
+            '--channel-layer', default='channels.layers.InMemoryChannelLayer',
+            help='Channel layer backend used for the run.'
+        )
+
+    async def run_client(self, application, token, messages, latencies):
+        communicator = WebsocketCommunicator(
+            application=application,
+            path=f'/dispatch/?token={token}'
+        )
+        connected, _ = await communicator.connect()
+        assert connected, 'Could not connect'
+        for index in range(messages):
+            start = time.perf_counter()
+            await communicator.send_json_to({
+                'type': 'create.dispatch',
+                'data': {
+                    'request_location': f'{index} Bench Street',
+                    'destination': 'Bench Road',
+                },
+            })
+            await communicator.receive_json_from(timeout=30)
+            latencies.append(time.perf_counter() - start)
+        await communicator.disconnect()
+
+    async def run(self, tokens, messages):
+        # Imported late so the overridden channel layer is picked up.
+        from config.routing import application
+
+        latencies = []
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            self.run_client(application, token, messages, latencies) for token in tokens
+        ))
+        return latencies, time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        users = create_fixture_users(options['clients'], prefix='consumer-bench')
+        tokens = [f'{AccessToken.for_user(user)}' for user in users]
+        channel_layers = {
+            'default': {'BACKEND': options['channel_layer']},
+        }
+        self.stdout.write(
+            f'{"helper":>10}{"messages/s":>12}{"p50 ms":>9}{"p99 ms":>9}'
+        )
+        try:
+            # The baseline runs every call on the one thread-sensitive thread.
+            runs = [('stock', stock_database_sync_to_async, None)]
+            runs.extend(
+                (f'pool {pool_size}', contextlib.nullcontext, pool_size)
+                for pool_size in options['pool_sizes']
+            )
+            for label, helper, pool_size in runs:
+                if pool_size is not None:
+                    db.set_pool_size(pool_size)
+                with override_settings(CHANNEL_LAYERS=channel_layers), unthrottled(), helper():
+                    latencies, elapsed = asyncio.run(self.run(tokens, options['messages']))
+                self.stdout.write(
+                    f'{label:>10}{len(latencies) / elapsed:>12.0f}'
+                    f'{percentile(latencies, 0.5) * 1000:>9.1f}'
+                    f'{percentile(latencies, 0.99) * 1000:>9.1f}'
+                )
+        finally:
+            # Consumers commit on their own connections; clean up explicitly.
+            Dispatch.objects.filter(destination='Bench Road').delete()
+            get_user_model().objects.filter(id__in=[user.id for user in users]).delete()
@@ -0,0 +1,36 @@
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from core.benchmarks import rollback, timed
+from core.ids import uuid7
+from core.models import Dispatch
+
+
+class Command(BaseCommand):
+    help = 'Compare Dispatch insert throughput with random (v4) and time-ordered (v7) primary keys.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--existing', type=int, default=0, help='Rows inserted before timing, to grow the index first.')
+        parser.add_argument('--batch-size', type=int, default=1, help='1 times single-row creates; larger values time bulk_create.')
+
+    def insert(self, generator, count, batch_size):
+        dispatches = (
+            Dispatch(id=generator(), request_location='A', destination='B')
+            for _ in range(count)
+        )
+        if batch_size == 1:
+            for dispatch in dispatches:
+                dispatch.save(force_insert=True)
+        else:
+            Dispatch.objects.bulk_create(dispatches, batch_size=batch_size)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        self.stdout.write(f'{"generator":<12}{"rows/s":>12}{"seconds":>10}')
+        for name, generator in (('uuid4', uuid.uuid4), ('uuid7', uuid7)):
+            with rollback():
+                self.insert(generator, options['existing'], 1000)
+                _, elapsed = timed(self.insert, generator, rows, options['batch_size'])
+            self.stdout.write(f'{name:<12}{rows / elapsed:>12.0f}{elapsed:>10.2f}')
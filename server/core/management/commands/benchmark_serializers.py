@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.benchmarks import (
+    create_fixture_dispatches, create_fixture_users, rollback, timed,
+)
+from core.models import Dispatch
+from core.serializers import DispatchReadSerializer, NestedDispatchSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare per-dispatch serialization cost of the WebSocket payload serializers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dispatches', type=int, default=1000)
+        parser.add_argument('--users', type=int, default=100)
+
+    def handle(self, *args, **options):
+        with rollback():
+            users = create_fixture_users(options['users'])
+            create_fixture_dispatches(options['dispatches'], users)
+            queryset = Dispatch.objects.order_by('created_at', 'id')
+            related = queryset.select_related('requestor', 'contractor')
+
+            # The consumer serializes instances it already holds, so the
+            # in-memory cases isolate the serializer cost from the query.
+            instances = list(related.all())
+            cases = (
+                ('NestedDispatchSerializer (lazy FKs)', lambda: NestedDispatchSerializer(
+                    list(queryset.all()), many=True
+                ).data),
+                ('NestedDispatchSerializer + select_related', lambda: NestedDispatchSerializer(
+                    list(related.all()), many=True
+                ).data),
+                ('DispatchReadSerializer + select_related', lambda: DispatchReadSerializer(
+                    list(related.all()), many=True
+                ).data),
+                ('DispatchReadSerializer.from_queryset', lambda: DispatchReadSerializer.from_queryset(
+                    queryset
+                )),
+                ('NestedDispatchSerializer (in memory)', lambda: NestedDispatchSerializer(
+                    instances, many=True
+                ).data),
+                ('DispatchReadSerializer (in memory)', lambda: DispatchReadSerializer(
+                    instances, many=True
+                ).data),
+            )
+            count = options['dispatches']
+            self.stdout.write(f'{"case":<45}{"us/dispatch":>14}{"queries":>10}')
+            for name, func in cases:
+                with CaptureQueriesContext(connection) as queries:
+                    _, elapsed = timed(func)
+                self.stdout.write(
+                    f'{name:<45}{elapsed / count * 1e6:>14.1f}{len(queries):>10}'
+                )
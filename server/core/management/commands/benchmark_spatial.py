@@ -0,0 +1,62 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.benchmarks import percentile, timed
+from core.spatial import ContractorIndex
+
+
+class Command(BaseCommand):
+    help = 'Measure ContractorIndex build, update and nearest-contractor query costs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+        parser.add_argument('--queries', type=int, default=2000)
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--cell-size', type=float, default=0.01)
+        parser.add_argument('--span', type=float, default=0.5, help='Side of the square area contractors are spread over, in degrees.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def point(self, generator, span):
+        # Around central Tokyo.
+        return (
+            35.68 + (generator.random() - 0.5) * span,
+            139.76 + (generator.random() - 0.5) * span,
+        )
+
+    def build(self, index, positions):
+        for contractor_id, position in enumerate(positions):
+            index.update(contractor_id, *position)
+
+    def handle(self, *args, **options):
+        generator = random.Random(options['seed'])
+        span = options['span']
+        self.stdout.write(
+            f'{"contractors":>12}{"build s":>10}{"update us":>11}'
+            f'{"p50 us":>9}{"p99 us":>9}'
+        )
+        for size in options['sizes']:
+            index = ContractorIndex(cell_size=options['cell_size'])
+            positions = [self.point(generator, span) for _ in range(size)]
+            _, build = timed(self.build, index, positions)
+
+            moves = [
+                (generator.randrange(size), self.point(generator, span))
+                for _ in range(options['queries'])
+            ]
+            start = time.perf_counter()
+            for contractor_id, position in moves:
+                index.update(contractor_id, *position)
+            update = (time.perf_counter() - start) / len(moves)
+
+            durations = []
+            for _ in range(options['queries']):
+                point = self.point(generator, span)
+                _, elapsed = timed(index.nearest, *point, options['k'])
+                durations.append(elapsed)
+            self.stdout.write(
+                f'{size:>12}{build:>10.2f}{update * 1e6:>11.1f}'
+                f'{percentile(durations, 0.5) * 1e6:>9.1f}'
+                f'{percentile(durations, 0.99) * 1e6:>9.1f}'
+            )
@@ -0,0 +1,47 @@
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.models import Dispatch
+
+
+class Command(BaseCommand):
+    help = 'Print query plans for the hot Dispatch queries and the indexes they use.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, default=1, help='User ID to plan per-user queries for.')
+        parser.add_argument('--analyze', action='store_true', help='Run EXPLAIN ANALYZE where the backend supports it.')
+
+    def get_queries(self, user_id):
+        return (
+            ('active dispatches (contractor)', Dispatch.objects.filter(
+                contractor_id=user_id
+            ).exclude(status=Dispatch.COMPLETED).values_list('id', flat=True)),
+            ('active dispatches (requestor)', Dispatch.objects.filter(
+                requestor_id=user_id
+            ).exclude(status=Dispatch.COMPLETED).values_list('id', flat=True)),
+            ('admin status filter', Dispatch.objects.filter(
+                status=Dispatch.REQUESTED
+            ).order_by('-created_at')[:100]),
+            ('dispatch list page (requestor)', Dispatch.objects.filter(
+                requestor_id=user_id
+            ).order_by('-created_at', '-id')[:51]),
+            ('unclaimed check', Dispatch.objects.filter(
+                id=uuid.uuid4(),
+                status=Dispatch.REQUESTED,
+                contractor__isnull=True
+            )),
+        )
+
+    def handle(self, *args, **options):
+        index_names = [index.name for index in Dispatch._meta.indexes]
+        explain_options = {'analyze': True} if options['analyze'] else {}
+        self.stdout.write(f'Backend: {connection.vendor}')
+        for name, queryset in self.get_queries(options['user']):
+            plan = queryset.explain(**explain_options)
+            used = [index for index in index_names if index in plan]
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n{name}'))
+            self.stdout.write(str(queryset.query))
+            self.stdout.write(plan)
+            self.stdout.write(f"indexes used: {', '.join(used) or 'none of core.Dispatch Meta.indexes'}")
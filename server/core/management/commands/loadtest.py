@@ -0,0 +1,101 @@
+import asyncio
+import json
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.benchmarks import create_fixture_users, unthrottled
+from core.loadtest import LoadTest, find_regressions
+from core.models import Dispatch
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate requestors and contractors against the ASGI application and '
+        'report handshake, create.dispatch, broadcast fan-out and REST list '
+        'latencies, optionally against a saved baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requestors', type=int, default=200)
+        parser.add_argument('--contractors', type=int, default=200)
+        parser.add_argument('--dispatches', type=int, default=2, help='Dispatches created by each requestor.')
+        parser.add_argument('--list-requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=100)
+        parser.add_argument(
+            '--channel-layer', default='channels.layers.InMemoryChannelLayer',
+            help='Channel layer backend used for the run.'
+        )
+        parser.add_argument('--baseline', type=Path, help='JSON file of baseline results.')
+        parser.add_argument('--save-baseline', action='store_true', help='Write the results to --baseline.')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed fractional regression.')
+
+    async def run(self, options, requestors, contractors):
+        # Imported late so the overridden channel layer is picked up.
+        from config.routing import application
+
+        load_test = LoadTest(application, options['concurrency'])
+        requestor_tokens = [f'{AccessToken.for_user(user)}' for user in requestors]
+        contractor_tokens = [f'{AccessToken.for_user(user)}' for user in contractors]
+        results = {}
+        try:
+            results['handshake'] = await load_test.handshake(
+                requestor_tokens, contractor_tokens
+            )
+            results['create_dispatch'], results['fan_out'] = await load_test.fan_out(
+                [user.id for user in requestors], options['dispatches']
+            )
+            results['list_dispatches'] = await load_test.list_dispatches(
+                requestor_tokens, options['list_requests']
+            )
+        finally:
+            await load_test.close()
+        return results
+
+    def handle(self, *args, **options):
+        requestors = create_fixture_users(options['requestors'], prefix='loadtest-requestor')
+        contractors = create_fixture_users(options['contractors'], prefix='loadtest-contractor')
+        group, _ = Group.objects.get_or_create(name='contractor')
+        group.user_set.add(*contractors)
+        # Every contractor receives every dispatch; size the queues for it.
+        capacity = options['requestors'] * options['dispatches'] + 100
+        channel_layers = {
+            'default': {
+                'BACKEND': options['channel_layer'],
+                'CONFIG': {'capacity': capacity},
+            },
+        }
+        try:
+            with override_settings(CHANNEL_LAYERS=channel_layers), unthrottled():
+                results = asyncio.run(self.run(options, requestors, contractors))
+        finally:
+            users = requestors + contractors
+            Dispatch.objects.filter(destination='Load Test Road').delete()
+            get_user_model().objects.filter(id__in=[user.id for user in users]).delete()
+
+        self.stdout.write(
+            f'{"scenario":<18}{"count":>8}{"per s":>10}{"p50 ms":>10}{"p99 ms":>10}'
+        )
+        for scenario, result in results.items():
+            self.stdout.write(
+                f'{scenario:<18}{result["count"]:>8}{result["throughput"]:>10.0f}'
+                f'{result["p50_ms"]:>10.1f}{result["p99_ms"]:>10.1f}'
+            )
+
+        baseline = options['baseline']
+        if baseline is None:
+            return
+        if options['save_baseline']:
+            baseline.write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(f'Saved baseline to {baseline}.')
+            return
+        regressions = find_regressions(
+            results, json.loads(baseline.read_text()), options['tolerance']
+        )
+        if regressions:
+            raise CommandError('Regressions against baseline:\n' + '\n'.join(regressions))
+        self.stdout.write('No regressions against baseline.')
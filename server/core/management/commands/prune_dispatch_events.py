@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.models import DispatchEvent
+
+
+class Command(BaseCommand):
+    help = 'Delete the replay events of dispatches completed a while ago.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention', type=float,
+            default=settings.DISPATCH_EVENTS['RETENTION'],
+            help='Seconds the events of a completed dispatch are kept.'
+        )
+
+    def handle(self, *args, **options):
+        deleted = DispatchEvent.prune(options['retention'])
+        self.stdout.write(f'Deleted {deleted} dispatch events.')
@@ -0,0 +1,111 @@
+import math
+import random
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import geo
+from core.benchmarks import percentile, timed
+from core.matching import Matcher, distance_matrix
+from core.spatial import ContractorIndex
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate matching rounds against random contractors and compare pickup '
+        'distance and message volume with first-come-first-served broadcasts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=20)
+        parser.add_argument('--dispatches', type=int, default=200, help='New dispatches per round.')
+        parser.add_argument('--contractors', type=int, default=2000)
+        parser.add_argument('--span', type=float, default=0.3, help='Side of the simulated area, in degrees.')
+        parser.add_argument('--solver', choices=('greedy', 'hungarian'), default=settings.DISPATCH_MATCHER['SOLVER'])
+        parser.add_argument('--seed', type=int, default=0)
+
+    def point(self, generator, span):
+        return (
+            35.68 + (generator.random() - 0.5) * span,
+            139.76 + (generator.random() - 0.5) * span,
+        )
+
+    def broadcast(self, generator, dispatches, contractors):
+        """
+        First-come-first-served: every contractor in the geohash cells around
+        the pickup is alerted and a random one of them wins the dispatch.
+        """
+        height, width = geo.cell_size(settings.DISPATCH_GEO['PRECISION'])
+        radius = settings.DISPATCH_GEO['RADIUS']
+
+        def get_cell(latitude, longitude):
+            return math.floor(latitude / height), math.floor(longitude / width)
+
+        cells = {contractor_id: get_cell(*position) for contractor_id, position in contractors.items()}
+        available = set(contractors)
+        messages = 0
+        distances = []
+        for _, latitude, longitude in dispatches:
+            row, column = get_cell(latitude, longitude)
+            alerted = [
+                contractor_id for contractor_id, (other_row, other_column) in cells.items()
+                if max(abs(other_row - row), abs(other_column - column)) <= radius
+            ]
+            messages += len(alerted)
+            alerted = [contractor_id for contractor_id in alerted if contractor_id in available]
+            if not alerted:
+                continue
+            winner = generator.choice(alerted)
+            available.discard(winner)
+            distances.append(distance_matrix([(latitude, longitude)], [contractors[winner]])[0][0])
+        return distances, messages
+
+    def handle(self, *args, **options):
+        generator = random.Random(options['seed'])
+        span = options['span']
+        matcher_settings = settings.DISPATCH_MATCHER
+        durations = []
+        totals = {'matched': 0, 'distance': 0.0, 'broadcast_matched': 0, 'broadcast_distance': 0.0, 'broadcast_messages': 0}
+        for _ in range(options['rounds']):
+            index = ContractorIndex(cell_size=settings.CONTRACTOR_INDEX['CELL_SIZE'])
+            contractors = {}
+            for contractor_id in range(options['contractors']):
+                contractors[contractor_id] = self.point(generator, span)
+                index.update(contractor_id, *contractors[contractor_id])
+            matcher = Matcher(
+                window=0,
+                solver=options['solver'],
+                candidates=matcher_settings['CANDIDATES'],
+                max_distance=matcher_settings['MAX_DISTANCE'],
+                offer_timeout=matcher_settings['OFFER_TIMEOUT'],
+                fallback_after=matcher_settings['FALLBACK_AFTER'],
+                index=index,
+            )
+            dispatches = [
+                (dispatch_id, *self.point(generator, span))
+                for dispatch_id in range(options['dispatches'])
+            ]
+            matches, elapsed = timed(matcher.match, dispatches)
+            durations.append(elapsed)
+            totals['matched'] += len(matches)
+            totals['distance'] += sum(distance for _, _, distance in matches)
+
+            distances, messages = self.broadcast(generator, dispatches, contractors)
+            totals['broadcast_matched'] += len(distances)
+            totals['broadcast_distance'] += sum(distances)
+            totals['broadcast_messages'] += messages
+
+        dispatched = options['rounds'] * options['dispatches']
+        self.stdout.write(
+            f'round p50 {percentile(durations, 0.5) * 1000:.1f} ms, '
+            f'p99 {percentile(durations, 0.99) * 1000:.1f} ms, '
+            f'{dispatched / sum(durations):.0f} dispatches/s'
+        )
+        self.stdout.write(f'{"":<12}{"matched":>10}{"mean km":>10}{"messages":>10}')
+        for name, matched, distance, messages in (
+            ('matcher', totals['matched'], totals['distance'], totals['matched']),
+            ('broadcast', totals['broadcast_matched'], totals['broadcast_distance'], totals['broadcast_messages']),
+        ):
+            self.stdout.write(
+                f'{name:<12}{matched:>10}{distance / max(matched, 1):>10.2f}{messages:>10}'
+            )
@@ -0,0 +1,294 @@
+import asyncio
+import logging
+import math
+import time
+
+from django.conf import settings
+
+from core import metrics
+from core.broadcasts import send_to_groups, user_group
+from core.db import database_sync_to_async
+from core.encoding import encoded_message
+from core.models import Dispatch
+from core.spatial import KM_PER_DEGREE, contractor_index
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+
+logger = logging.getLogger(__name__)
+
+
+def distance_matrix(origins, destinations):
+    """
+    Equirectangular distances in km from each ``(latitude, longitude)`` origin
+    (rows) to each destination (columns); a numpy array when numpy is
+    installed, nested lists otherwise.
+    """
+    if numpy is not None:
+        origins = numpy.asarray(origins, dtype=float).reshape(-1, 2)
+        destinations = numpy.asarray(destinations, dtype=float).reshape(-1, 2)
+        scale = numpy.cos(numpy.radians(origins[:, 0]))[:, None]
+        x = (destinations[None, :, 1] - origins[:, None, 1]) * scale
+        y = destinations[None, :, 0] - origins[:, None, 0]
+        return numpy.hypot(x, y) * KM_PER_DEGREE
+    matrix = []
+    for latitude, longitude in origins:
+        scale = math.cos(math.radians(latitude))
+        matrix.append([
+            math.hypot(
+                (other_longitude - longitude) * scale, other_latitude - latitude
+            ) * KM_PER_DEGREE
+            for other_latitude, other_longitude in destinations
+        ])
+    return matrix
+
+
+def solve_greedy(matrix, max_distance=None):
+    limit = math.inf if max_distance is None else max_distance
+    if numpy is not None and isinstance(matrix, numpy.ndarray):
+        order = numpy.argsort(matrix, axis=None, kind='stable')
+        distances = matrix.ravel()[order]
+        order = order[numpy.isfinite(distances) & (distances <= limit)]
+        rows, columns = numpy.unravel_index(order, matrix.shape)
+        candidates = zip(rows.tolist(), columns.tolist(), distances[:len(order)].tolist())
+    else:
+        candidates = sorted(
+            (
+                (row, column, distance)
+                for row, distances in enumerate(matrix)
+                for column, distance in enumerate(distances)
+                if math.isfinite(distance) and distance <= limit
+            ),
+            key=lambda candidate: candidate[2]
+        )
+    pairs = []
+    used_rows = set()
+    used_columns = set()
+    for row, column, distance in candidates:
+        if row in used_rows or column in used_columns:
+            continue
+        pairs.append((row, column, distance))
+        used_rows.add(row)
+        used_columns.add(column)
+    return pairs
+
+
+def solve_hungarian(matrix, max_distance=None):
+    matrix = numpy.asarray(matrix, dtype=float)
+    limit = math.inf if max_distance is None else max_distance
+    feasible = numpy.isfinite(matrix) & (matrix <= limit)
+    if not feasible.any():
+        return []
+    # Infeasible pairs cost more than any complete feasible assignment, so
+    # the solver maximises the number of matches before minimising distance.
+    penalty = (matrix[feasible].max() + 1.0) * (min(matrix.shape) + 1)
+    cost = numpy.where(feasible, matrix, penalty)
+    rows, columns = linear_sum_assignment(cost)
+    return [
+        (row, column, float(matrix[row, column]))
+        for row, column in zip(rows.tolist(), columns.tolist())
+        if feasible[row, column]
+    ]
+
+
+def assign(matrix, max_distance=None, solver='greedy'):
+    """
+    One-to-one ``(row, column, distance)`` assignments for a distance matrix,
+    skipping pairs further apart than ``max_distance``. The 'hungarian'
+    solver minimises total distance and needs numpy and scipy; otherwise the
+    greedy solver repeatedly takes the closest remaining pair.
+    """
+    if solver == 'hungarian' and numpy is not None and linear_sum_assignment is not None:
+        return solve_hungarian(matrix, max_distance)
+    return solve_greedy(matrix, max_distance)
+
+
+def candidate_contractors(index, points, k, max_distance=None):
+    # Union of each point's k nearest available contractors, in stable order.
+    contractor_ids = {}
+    for latitude, longitude in points:
+        for contractor_id, _ in index.nearest(latitude, longitude, k, max_distance):
+            contractor_ids[contractor_id] = None
+    return list(contractor_ids)
+
+
+@database_sync_to_async
+def get_unclaimed_ids(dispatch_ids):
+    return set(Dispatch.objects.filter(
+        id__in=dispatch_ids,
+        status=Dispatch.REQUESTED,
+        contractor__isnull=True
+    ).values_list('id', flat=True))
+
+
+class Matcher:
+    """
+    Assigns dispatches awaiting a contractor in rounds.
+
+    Every ``window`` seconds the pending dispatches without an open offer are
+    matched against nearby available contractors from the ContractorIndex as
+    one assignment problem, and each chosen contractor is sent a
+    ``dispatch.offer`` on their own ``user.<id>`` group instead of a
+    broadcast. Offers expire after ``offer_timeout`` seconds and the
+    contractor is not offered that dispatch again; dispatches still unclaimed
+    after ``fallback_after`` seconds are broadcast to every contractor.
+    """
+
+    def __init__(
+        self, window, solver, candidates, max_distance, offer_timeout,
+        fallback_after, index=None
+    ):
+        if solver == 'hungarian' and (numpy is None or linear_sum_assignment is None):
+            logger.warning(
+                "The 'hungarian' solver needs numpy and scipy; using 'greedy' instead."
+            )
+        self.window = window
+        self.solver = solver
+        self.candidates = candidates
+        self.max_distance = max_distance
+        self.offer_timeout = offer_timeout
+        self.fallback_after = fallback_after
+        self.index = contractor_index if index is None else index
+        self._pending = {}
+        self._offers = {}
+        self._declined = {}
+        self._channel_layer = None
+        self._task = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def get_offer(self, dispatch_id):
+        offer = self._offers.get(dispatch_id)
+        return None if offer is None else offer[0]
+
+    def submit(self, items, channel_layer):
+        submitted_at = time.monotonic()
+        for dispatch, dispatch_data in items:
+            self._pending[dispatch.id] = (dispatch, dispatch_data, submitted_at)
+        self._channel_layer = channel_layer
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while self._pending:
+            await asyncio.sleep(self.window)
+            await self.run_round()
+
+    def _withdraw(self, dispatch_id):
+        offer = self._offers.pop(dispatch_id, None)
+        if offer is not None:
+            self.index.set_available(offer[0], True)
+
+    def discard(self, dispatch_id):
+        self._pending.pop(dispatch_id, None)
+        self._declined.pop(dispatch_id, None)
+        self._withdraw(dispatch_id)
+
+    def decline(self, dispatch_id, contractor_id):
+        if self.get_offer(dispatch_id) != contractor_id:
+            return False
+        self._declined.setdefault(dispatch_id, set()).add(contractor_id)
+        self._withdraw(dispatch_id)
+        return True
+
+    def clear(self):
+        if self._task is not None:
+            self._task.cancel()
+        for dispatch_id in list(self._pending):
+            self.discard(dispatch_id)
+
+    def match(self, dispatches):
+        """
+        ``(dispatch_id, contractor_id, distance)`` assignments for
+        ``(dispatch_id, latitude, longitude)`` tuples.
+        """
+        points = [(latitude, longitude) for _, latitude, longitude in dispatches]
+        contractor_ids = candidate_contractors(
+            self.index, points, self.candidates, self.max_distance
+        )
+        if not contractor_ids:
+            return []
+        matrix = distance_matrix(
+            points, [self.index.get(contractor_id) for contractor_id in contractor_ids]
+        )
+        columns = {contractor_id: column for column, contractor_id in enumerate(contractor_ids)}
+        for row, (dispatch_id, _, _) in enumerate(dispatches):
+            for contractor_id in self._declined.get(dispatch_id, ()):
+                column = columns.get(contractor_id)
+                if column is None:
+                    continue
+                if numpy is not None:
+                    matrix[row, column] = math.inf
+                else:
+                    matrix[row][column] = math.inf
+        return [
+            (dispatches[row][0], contractor_ids[column], distance)
+            for row, column, distance in assign(matrix, self.max_distance, self.solver)
+        ]
+
+    async def run_round(self):
+        now = time.monotonic()
+        for dispatch_id, (contractor_id, expires_at) in list(self._offers.items()):
+            if expires_at <= now:
+                self._declined.setdefault(dispatch_id, set()).add(contractor_id)
+                self._withdraw(dispatch_id)
+
+        # Dispatches claimed elsewhere, e.g. on another server, leave the pool.
+        unclaimed_ids = await get_unclaimed_ids(list(self._pending))
+        for dispatch_id in list(self._pending):
+            if dispatch_id not in unclaimed_ids:
+                self.discard(dispatch_id)
+
+        waiting = [
+            (dispatch_id, dispatch, dispatch_data, submitted_at)
+            for dispatch_id, (dispatch, dispatch_data, submitted_at) in self._pending.items()
+            if dispatch_id not in self._offers
+        ]
+        expired = [item for item in waiting if now - item[3] >= self.fallback_after]
+        if expired:
+            for dispatch_id, _, _, _ in expired:
+                self.discard(dispatch_id)
+            await send_to_groups(self._channel_layer, {
+                'contractors': [dispatch_data for _, _, dispatch_data, _ in expired],
+            })
+            waiting = [item for item in waiting if item[0] in self._pending]
+
+        matches = self.match([
+            (dispatch_id, dispatch.request_latitude, dispatch.request_longitude)
+            for dispatch_id, dispatch, _, _ in waiting
+        ])
+        for dispatch_id, contractor_id, _ in matches:
+            self.index.set_available(contractor_id, False)
+            self._offers[dispatch_id] = (contractor_id, now + self.offer_timeout)
+        await asyncio.gather(*(
+            self._channel_layer.group_send(user_group(contractor_id), encoded_message({
+                'type': 'dispatch.offer',
+                'data': self._pending[dispatch_id][1],
+                'distance': round(distance, 3),
+            }))
+            for dispatch_id, contractor_id, distance in matches
+        ))
+        return matches
+
+
+matcher = Matcher(
+    window=settings.DISPATCH_MATCHER['WINDOW'],
+    solver=settings.DISPATCH_MATCHER['SOLVER'],
+    candidates=settings.DISPATCH_MATCHER['CANDIDATES'],
+    max_distance=settings.DISPATCH_MATCHER['MAX_DISTANCE'],
+    offer_timeout=settings.DISPATCH_MATCHER['OFFER_TIMEOUT'],
+    fallback_after=settings.DISPATCH_MATCHER['FALLBACK_AFTER'],
+)
+metrics.registry.collect(
+    'dispatch_matcher_pending', 'Dispatches waiting in the matcher.',
+    lambda: len(matcher)
+)
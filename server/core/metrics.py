@@ -0,0 +1,211 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+# Instrumented code checks this first, so disabled metrics cost one
+# attribute lookup per call site.
+ENABLED = settings.METRICS['ENABLED']
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+current_queries = ContextVar('current_queries', default=None)
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, f'{value}'.replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in zip(names, values)
+    )
+    return f'{{{pairs}}}'
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else f'{value}'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def render(self):
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            yield f'{self.name}{format_labels(self.labels, label_values)} {format_value(value)}'
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        with self._lock:
+            values = [
+                (label_values, list(counts), total, count)
+                for label_values, (counts, total, count) in self._values.items()
+            ]
+        names = self.labels + ('le',)
+        for label_values, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                labels = format_labels(names, label_values + (bound,))
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = format_labels(self.labels, label_values)
+            yield f'{self.name}_sum{labels} {format_value(total)}'
+            yield f'{self.name}_count{labels} {count}'
+
+
+class Collected(Metric):
+    """
+    Metric read from existing state when scraped. ``collect`` returns a
+    number, or a dict of label value tuples to numbers.
+    """
+
+    def __init__(self, name, description, kind, collect, labels=()):
+        super().__init__(name, description, labels)
+        self.kind = kind
+        self.collect = collect
+
+    def render(self):
+        values = self.collect()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for label_values, value in values.items():
+            yield f'{self.name}{format_labels(self.labels, label_values)} {format_value(value)}'
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, description, labels=()):
+        return self.register(Counter(name, description, labels))
+
+    def gauge(self, name, description, labels=()):
+        return self.register(Gauge(name, description, labels))
+
+    def histogram(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, description, labels, buckets))
+
+    def collect(self, name, description, collect, kind='gauge', labels=()):
+        return self.register(Collected(name, description, kind, collect, labels))
+
+    def render(self):
+        # Prometheus text exposition format, version 0.0.4.
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.description}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+message_seconds = registry.histogram(
+    'dispatch_message_seconds', 'Time to handle a WebSocket message.', ('message_type',)
+)
+message_queries = registry.histogram(
+    'dispatch_message_queries', 'Database queries run per WebSocket message.',
+    ('message_type',), buckets=(0, 1, 2, 3, 5, 8, 13, 21),
+)
+auth_seconds = registry.histogram(
+    'websocket_auth_seconds', 'Time to resolve the user of a WebSocket handshake.'
+)
+database_wait_seconds = registry.histogram(
+    'database_call_wait_seconds', 'Time database calls from async code wait for a pool thread.'
+)
+database_call_seconds = registry.histogram(
+    'database_call_seconds', 'Time database calls from async code spend on a pool thread.'
+)
+send_seconds = registry.histogram(
+    'websocket_send_seconds', 'Time to write one frame to a WebSocket.'
+)
+group_fan_out = registry.histogram(
+    'channel_group_fan_out', 'Groups addressed by one broadcast.',
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250),
+)
+connections = registry.gauge(
+    'websocket_connections', 'Open WebSocket connections.'
+)
+
+
+@contextmanager
+def track_message(message_type):
+    queries = [0]
+    token = current_queries.set(queries)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current_queries.reset(token)
+        message_seconds.observe(time.perf_counter() - start, message_type)
+        message_queries.observe(queries[0], message_type)
+
+
+def count_query(execute, sql, params, many, context):
+    # The counter is shared with DB threads through the copied context.
+    queries = current_queries.get()
+    if queries is not None:
+        queries[0] += 1
+    return execute(sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    if ENABLED and count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
@@ -0,0 +1,24 @@
+# Generated by Django 4.0 on 2026-10-18 03:26
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_dispatch_contractor_dispatch_requestor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dispatch',
+            name='request_latitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90.0), django.core.validators.MaxValueValidator(90.0)]),
+        ),
+        migrations.AddField(
+            model_name='dispatch',
+            name='request_longitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180.0), django.core.validators.MaxValueValidator(180.0)]),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.0 on 2026-10-18 03:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_dispatch_request_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dispatch',
+            index=models.Index(fields=['created_at', 'id'], name='dispatch_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dispatch',
+            index=models.Index(fields=['requestor', 'created_at', 'id'], name='dispatch_req_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dispatch',
+            index=models.Index(fields=['contractor', 'created_at', 'id'], name='dispatch_con_created_idx'),
+        ),
+    ]
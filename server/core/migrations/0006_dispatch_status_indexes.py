@@ -0,0 +1,33 @@
+# Generated by Django 4.0 on 2026-10-18 03:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_dispatch_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dispatch',
+            index=models.Index(fields=['contractor', 'status'], name='dispatch_con_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dispatch',
+            index=models.Index(fields=['requestor', 'status'], name='dispatch_req_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dispatch',
+            index=models.Index(fields=['status', 'created_at'], name='dispatch_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dispatch',
+            index=models.Index(condition=models.Q(('status', 'COMPLETED'), _negated=True), fields=['contractor'], name='dispatch_con_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dispatch',
+            index=models.Index(condition=models.Q(('status', 'COMPLETED'), _negated=True), fields=['requestor'], name='dispatch_req_active_idx'),
+        ),
+    ]
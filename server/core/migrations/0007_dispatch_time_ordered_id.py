@@ -0,0 +1,26 @@
+# Generated by Django 4.0 on 2026-10-18 03:31
+
+import core.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_dispatch_status_indexes'),
+    ]
+
+    # The default is applied in Python only, so the schema is untouched:
+    # existing random IDs (and URLs built from them) are kept as they are and
+    # only new rows get time-ordered IDs.
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='dispatch',
+                    name='id',
+                    field=models.UUIDField(default=core.ids.generate_dispatch_id, editable=False, primary_key=True, serialize=False),
+                ),
+            ],
+        ),
+    ]
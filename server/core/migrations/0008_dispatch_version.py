@@ -0,0 +1,18 @@
+# Generated by Django 4.0 on 2026-10-18 03:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_dispatch_time_ordered_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dispatch',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
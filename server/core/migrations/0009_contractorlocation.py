@@ -0,0 +1,23 @@
+# Generated by Django 4.0 on 2026-10-18 03:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_dispatch_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContractorLocation',
+            fields=[
+                ('contractor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='location', serialize=False, to='core.user')),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('recorded_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.0 on 2026-10-18 03:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_dispatch_destination_coordinates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DispatchEvent',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('payload', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('dispatch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='core.dispatch')),
+            ],
+        ),
+    ]
@@ -1,9 +1,25 @@
-import uuid
+import datetime
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import F, Q
 from django.shortcuts import reverse
+from django.utils import timezone
+
+from core.encoding import dumps
+from core.ids import generate_dispatch_id
+
+
+def get_transition_sources(transitions):
+    return {
+        target: tuple(
+            source for source, targets in transitions.items()
+            if source == target or target in targets
+        )
+        for target in transitions
+    }
 
 
 class User(AbstractUser):
@@ -23,9 +39,18 @@ class Dispatch(models.Model):
         (COMPLETED, COMPLETED),
     )
 
+    # Legal status changes; staying in the same status is always allowed.
+    TRANSITIONS = {
+        REQUESTED: (STARTED, IN_PROGRESS),
+        STARTED: (IN_PROGRESS,),
+        IN_PROGRESS: (COMPLETED,),
+        COMPLETED: (),
+    }
+    TRANSITION_SOURCES = get_transition_sources(TRANSITIONS)
+
     id = models.UUIDField(
         primary_key=True,
-        default=uuid.uuid4,
+        default=generate_dispatch_id,
         editable=False,
     )
     created_at = models.DateTimeField(
@@ -40,6 +65,26 @@ class Dispatch(models.Model):
     destination = models.CharField(
         max_length=256,
     )
+    request_latitude = models.FloatField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(-90.0), MaxValueValidator(90.0)],
+    )
+    request_longitude = models.FloatField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(-180.0), MaxValueValidator(180.0)],
+    )
+    destination_latitude = models.FloatField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(-90.0), MaxValueValidator(90.0)],
+    )
+    destination_longitude = models.FloatField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(-180.0), MaxValueValidator(180.0)],
+    )
     status = models.CharField(
         max_length=20,
         choices=STATUSES,
@@ -59,9 +104,185 @@ class Dispatch(models.Model):
         on_delete=models.DO_NOTHING,
         related_name='requestors',
     )
+    version = models.PositiveIntegerField(
+        default=0,
+    )
+
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('created_at', 'id'),
+                name='dispatch_created_idx',
+            ),
+            models.Index(
+                fields=('requestor', 'created_at', 'id'),
+                name='dispatch_req_created_idx',
+            ),
+            models.Index(
+                fields=('contractor', 'created_at', 'id'),
+                name='dispatch_con_created_idx',
+            ),
+            models.Index(
+                fields=('contractor', 'status'),
+                name='dispatch_con_status_idx',
+            ),
+            models.Index(
+                fields=('requestor', 'status'),
+                name='dispatch_req_status_idx',
+            ),
+            models.Index(
+                fields=('status', 'created_at'),
+                name='dispatch_status_created_idx',
+            ),
+            # Active dispatches per user, for backends with partial indexes.
+            # MySQL skips these and uses the (user, status) indexes above.
+            models.Index(
+                fields=('contractor',),
+                condition=~Q(status='COMPLETED'),
+                name='dispatch_con_active_idx',
+            ),
+            models.Index(
+                fields=('requestor',),
+                condition=~Q(status='COMPLETED'),
+                name='dispatch_req_active_idx',
+            ),
+        )
+
+    @property
+    def has_request_coordinates(self):
+        return (
+            self.request_latitude is not None
+            and self.request_longitude is not None
+        )
+
+    @classmethod
+    def can_transition(cls, source, target):
+        return source in cls.TRANSITION_SOURCES.get(target, ())
+
+    @classmethod
+    def transition(cls, dispatch_id, status, contractor_id, expected_version=None):
+        # Moves a dispatch claimed by ``contractor_id`` to ``status`` with one
+        # narrow UPDATE that only matches rows in a legal source status (and
+        # version, if given); dispatches leave REQUESTED only through claim().
+        # Returns the new ``(version, updated_at)``, or None if no row
+        # matched. Without ``expected_version`` the new version is read back,
+        # so run it in a transaction.
+        sources = [
+            source for source in cls.TRANSITION_SOURCES.get(status, ())
+            if source != cls.REQUESTED
+        ]
+        if not sources:
+            return None
+        queryset = cls.objects.filter(
+            id=dispatch_id,
+            contractor_id=contractor_id,
+            status__in=sources,
+        )
+        if expected_version is not None:
+            queryset = queryset.filter(version=expected_version)
+        updated_at = timezone.now()
+        if queryset.update(
+            status=status,
+            version=F('version') + 1,
+            updated_at=updated_at,
+        ) != 1:
+            return None
+        if expected_version is None:
+            version = cls.objects.values_list('version', flat=True).get(id=dispatch_id)
+        else:
+            version = expected_version + 1
+        return version, updated_at
+
+    @classmethod
+    def claim(cls, dispatch_id, contractor):
+        # A single conditional UPDATE: exactly one concurrent claimant wins
+        # and losers are told so without re-reading the row.
+        return cls.objects.filter(
+            id=dispatch_id,
+            status=cls.REQUESTED,
+            contractor__isnull=True,
+        ).update(
+            contractor_id=contractor.pk,
+            status=cls.STARTED,
+            version=F('version') + 1,
+            updated_at=timezone.now(),
+        ) == 1
+
+    def save_if_version(self, expected_version, update_fields):
+        # Optimistic concurrency: write only if nobody bumped the version
+        # since ``expected_version`` was read.
+        self.updated_at = timezone.now()
+        values = {name: getattr(self, name) for name in update_fields}
+        values['updated_at'] = self.updated_at
+        updated = type(self).objects.filter(
+            pk=self.pk,
+            version=expected_version,
+        ).update(version=F('version') + 1, **values)
+        if updated:
+            self.version = expected_version + 1
+        return updated == 1
 
     def __str__(self):
         return f'{self.id}'
 
     def get_absolute_url(self):
         return reverse('core:dispatch_detail', kwargs={'dispatch_id': self.id})
+
+
+class DispatchEvent(models.Model):
+    """
+    Append-only log of the updates broadcast to a dispatch's group, replayed
+    to clients that reconnect with the last ``seq`` they saw.
+
+    Events are written in the same transaction as the change they describe,
+    after the dispatch row is locked by its UPDATE, so the events of one
+    dispatch get increasing ``seq`` values in commit order. Those of
+    completed dispatches are deleted by ``prune`` once they are no longer
+    worth replaying.
+    """
+    seq = models.BigAutoField(
+        primary_key=True,
+    )
+    dispatch = models.ForeignKey(
+        Dispatch,
+        on_delete=models.CASCADE,
+        related_name='events',
+    )
+    payload = models.TextField()
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+    )
+
+    @classmethod
+    def record(cls, dispatch_id, content):
+        # Returns the message content with its sequence number added.
+        event = cls.objects.create(dispatch_id=dispatch_id, payload=dumps(content))
+        return {**content, 'seq': event.seq}
+
+    @classmethod
+    def prune(cls, retention, now=None):
+        # Deletes the events of dispatches completed more than ``retention``
+        # seconds ago; returns how many were deleted.
+        now = timezone.now() if now is None else now
+        return cls.objects.filter(
+            dispatch__status=Dispatch.COMPLETED,
+            dispatch__updated_at__lt=now - datetime.timedelta(seconds=retention),
+        ).delete()[0]
+
+    def __str__(self):
+        return f'{self.dispatch_id}:{self.seq}'
+
+
+class ContractorLocation(models.Model):
+    contractor = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='location',
+    )
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    recorded_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.contractor_id}'
@@ -0,0 +1,129 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import OrderedDict
+
+from core import metrics
+
+
+logger = logging.getLogger(__name__)
+
+# Totals across every connection in this process.
+stats = {
+    'sent': 0,
+    'dropped': 0,
+    'coalesced': 0,
+    'queued': 0,
+    'slow_disconnects': 0,
+}
+
+metrics.registry.collect(
+    'websocket_outbound_frames_total', 'Frames put on WebSocket outbound queues.',
+    lambda: {(name,): stats[name] for name in ('sent', 'dropped', 'coalesced')},
+    kind='counter', labels=('outcome',)
+)
+metrics.registry.collect(
+    'websocket_outbound_queued_frames', 'Frames waiting in WebSocket outbound queues.',
+    lambda: stats['queued']
+)
+metrics.registry.collect(
+    'websocket_slow_disconnects_total', 'Clients disconnected for falling behind.',
+    lambda: stats['slow_disconnects'], kind='counter'
+)
+
+
+class OutboundQueue:
+    """
+    Bounded queue of frames waiting to be written to one WebSocket.
+
+    Frames are written in order by a single writer task, so a client on a
+    slow link only holds up its own queue. A frame put with a ``key``
+    replaces the queued frame with the same key: a full dispatch state
+    supersedes any queued full or partial state of that dispatch, a partial
+    state only a queued partial one. The replacement moves to the back of
+    the queue so nothing older is applied after it.
+
+    ``put`` refuses frames and marks the queue ``slow`` once it holds
+    ``max_size`` frames or its oldest frame has waited ``max_lag`` seconds;
+    the owner is expected to disconnect the client.
+
+    If a write fails, the error is logged, the queue is marked ``failed``
+    and emptied, and ``on_error`` is awaited so the owner can close the
+    connection.
+    """
+
+    def __init__(self, send, max_size, max_lag, on_error=None):
+        self._send = send
+        self.max_size = max_size
+        self.max_lag = max_lag
+        self.on_error = on_error
+        self.slow = False
+        self.failed = False
+        self._frames = OrderedDict()
+        self._sequence = itertools.count()
+        self._task = None
+
+    def __len__(self):
+        return len(self._frames)
+
+    def get_lag(self, now=None):
+        if not self._frames:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        return now - next(iter(self._frames.values()))[0]
+
+    def _pop(self, frame_key):
+        if self._frames.pop(frame_key, None) is None:
+            return False
+        stats['queued'] -= 1
+        return True
+
+    def put(self, text_data=None, bytes_data=None, key=None, partial=False):
+        if self.slow or self.failed:
+            stats['dropped'] += 1
+            return False
+        now = time.monotonic()
+        if key is None:
+            frame_key = next(self._sequence)
+        else:
+            frame_key = (key, partial)
+            coalesced = self._pop(frame_key)
+            if not partial:
+                coalesced = self._pop((key, True)) or coalesced
+            if coalesced:
+                stats['coalesced'] += 1
+        if len(self._frames) >= self.max_size or self.get_lag(now) > self.max_lag:
+            self.slow = True
+            stats['dropped'] += 1
+            stats['slow_disconnects'] += 1
+            return False
+        self._frames[frame_key] = (now, text_data, bytes_data)
+        stats['queued'] += 1
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._drain())
+        return True
+
+    async def _drain(self):
+        while self._frames:
+            _, (_, text_data, bytes_data) = self._frames.popitem(last=False)
+            stats['queued'] -= 1
+            try:
+                await self._send(text_data, bytes_data)
+            except Exception:
+                logger.exception('Could not write to the WebSocket.')
+                self.failed = True
+                self._clear()
+                if self.on_error is not None:
+                    await self.on_error()
+                return
+            stats['sent'] += 1
+
+    def _clear(self):
+        stats['queued'] -= len(self._frames)
+        self._frames.clear()
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        self._clear()
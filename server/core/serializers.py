@@ -1,5 +1,8 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
 from .models import Dispatch
@@ -38,14 +41,82 @@ class LogInSerializer(TokenObtainPairSerializer):
         for key, value in user_data.items():
             if key != 'id':
                 token[key] = value
+        # Lets WebSocket handshakes resolve the user's role without a query.
+        token['groups'] = list(user.groups.values_list('name', flat=True))
         return token
 
 
+def parse_user_id(data):
+    # Integral ids only: int() would also turn True into 1 and 1.9 into 1.
+    if isinstance(data, bool) or (isinstance(data, float) and not data.is_integer()):
+        return None
+    try:
+        return int(data)
+    except (TypeError, ValueError):
+        return None
+
+
+class UserPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    # Resolves users prefetched by DispatchListSerializer without a query;
+    # other ids go through the usual lookup.
+    def to_internal_value(self, data):
+        if isinstance(data, float) and not data.is_integer():
+            # The ORM would truncate 1.9 to the id 1.
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        users = self.context.get('users')
+        if users is not None:
+            user = users.get(parse_user_id(data))
+            if user is not None:
+                return user
+        return super().to_internal_value(data)
+
+
+class DispatchListSerializer(serializers.ListSerializer):
+    user_fields = ('requestor', 'contractor')
+
+    def to_internal_value(self, data):
+        # Checked first so an oversized batch is not validated item by item.
+        if isinstance(data, list) and len(data) > settings.DISPATCH_BATCH_MAX_SIZE:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    f'Batches are limited to {settings.DISPATCH_BATCH_MAX_SIZE} dispatches.'
+                ],
+            })
+        if isinstance(data, list):
+            user_ids = set()
+            for item in data:
+                if not isinstance(item, dict):
+                    continue
+                for name in self.user_fields:
+                    user_id = parse_user_id(item.get(name))
+                    if user_id is not None:
+                        user_ids.add(user_id)
+            self.context['users'] = get_user_model().objects.in_bulk(user_ids)
+        return super().to_internal_value(data)
+
+    def create(self, validated_data):
+        return Dispatch.objects.bulk_create(
+            [Dispatch(**attrs) for attrs in validated_data]
+        )
+
+
 class DispatchSerializer(serializers.ModelSerializer):
+    requestor = UserPrimaryKeyRelatedField(
+        queryset=get_user_model().objects.all(),
+        allow_null=True,
+        required=False,
+    )
+    contractor = UserPrimaryKeyRelatedField(
+        queryset=get_user_model().objects.all(),
+        allow_null=True,
+        required=False,
+    )
+
     class Meta:
         model = Dispatch
         fields = '__all__'
-        read_only_fields = ('id', 'created_at', 'updated_at')
+        read_only_fields = ('id', 'created_at', 'updated_at', 'version')
+        list_serializer_class = DispatchListSerializer
 
 
 class NestedDispatchSerializer(serializers.ModelSerializer):
@@ -56,3 +127,101 @@ class NestedDispatchSerializer(serializers.ModelSerializer):
         model = Dispatch
         fields = '__all__'
         depth = 1
+
+
+class DispatchReadSerializer(serializers.BaseSerializer):
+    """
+    Read-only equivalent of NestedDispatchSerializer for the hot path.
+
+    Produces the same output from precomputed field lists instead of DRF's
+    per-field machinery. Querysets should use ``select_related`` on the user
+    foreign keys, or go through ``from_queryset`` to read ``.values()`` rows.
+    """
+
+    related_fields = ('requestor', 'contractor')
+    datetime_fields = ('created_at', 'updated_at')
+    datetime_field = serializers.DateTimeField()
+    _fields = None
+    _user_field_names = None
+
+    @classmethod
+    def get_fields_spec(cls):
+        # (name, kind) pairs in NestedDispatchSerializer's output order.
+        if cls._fields is None:
+            cls._user_field_names = tuple(
+                name for name, field in UserSerializer().fields.items()
+                if not field.write_only
+            )
+            cls._fields = tuple(
+                (name, (
+                    'user' if name in cls.related_fields
+                    else 'datetime' if name in cls.datetime_fields
+                    else 'uuid' if name == 'id'
+                    else 'value'
+                ))
+                for name in NestedDispatchSerializer().fields
+            )
+        return cls._fields, cls._user_field_names
+
+    @classmethod
+    def represent_datetime(cls, value, current_timezone):
+        if current_timezone is None or not timezone.is_aware(value):
+            return cls.datetime_field.to_representation(value)
+        value = value.astimezone(current_timezone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+    @classmethod
+    def represent(cls, get_value, get_user_value):
+        fields, user_field_names = cls.get_fields_spec()
+        current_timezone = timezone.get_current_timezone() if settings.USE_TZ else None
+        data = {}
+        for name, kind in fields:
+            if kind == 'user':
+                data[name] = get_user_value(name, user_field_names)
+                continue
+            value = get_value(name)
+            if value is None or kind == 'value':
+                data[name] = value
+            elif kind == 'uuid':
+                data[name] = f'{value}'
+            else:
+                data[name] = cls.represent_datetime(value, current_timezone)
+        return data
+
+    @classmethod
+    def from_queryset(cls, queryset):
+        fields, user_field_names = cls.get_fields_spec()
+        columns = [name for name, kind in fields if kind != 'user']
+        for name in cls.related_fields:
+            columns.extend(
+                f'{name}__{user_field}' for user_field in user_field_names
+            )
+
+        def get_user_value(name, user_field_names):
+            if row[f'{name}__id'] is None:
+                return None
+            return {
+                user_field: row[f'{name}__{user_field}']
+                for user_field in user_field_names
+            }
+
+        data = []
+        for row in queryset.values(*columns):
+            data.append(cls.represent(row.__getitem__, get_user_value))
+        return data
+
+    def to_representation(self, instance):
+        def get_user_value(name, user_field_names):
+            user = getattr(instance, name)
+            if user is None:
+                return None
+            return {
+                user_field: getattr(user, user_field)
+                for user_field in user_field_names
+            }
+
+        return self.represent(
+            lambda name: getattr(instance, name), get_user_value
+        )
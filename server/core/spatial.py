@@ -0,0 +1,175 @@
+import heapq
+import math
+
+from django.conf import settings
+
+from core import metrics
+
+
+KM_PER_DEGREE = 111.195
+
+
+class ContractorIndex:
+    """
+    In-process grid index of live contractor positions.
+
+    Positions are bucketed into ``cell_size`` degree cells and only available
+    contractors are kept in the buckets, so ``nearest`` scans rings of cells
+    outwards from the query point and stops as soon as no unscanned cell can
+    hold anything closer than the k-th match. Distances use an
+    equirectangular approximation, which is accurate at city scale; cells do
+    not wrap around the antimeridian.
+
+    Open connections are counted per contractor with ``add_connection`` and
+    ``remove_connection``; a contractor leaves the index when their last
+    connection closes.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self._cells = {}
+        self._positions = {}
+        self._available = set()
+        self._connections = {}
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, contractor_id):
+        return contractor_id in self._positions
+
+    def get(self, contractor_id):
+        return self._positions.get(contractor_id)
+
+    def is_available(self, contractor_id):
+        return contractor_id in self._available
+
+    def _get_cell(self, latitude, longitude):
+        return (
+            math.floor(latitude / self.cell_size),
+            math.floor(longitude / self.cell_size),
+        )
+
+    def _add_to_cell(self, contractor_id, latitude, longitude):
+        cell = self._get_cell(latitude, longitude)
+        self._cells.setdefault(cell, {})[contractor_id] = (latitude, longitude)
+
+    def _remove_from_cell(self, contractor_id, latitude, longitude):
+        cell = self._get_cell(latitude, longitude)
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(contractor_id, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def update(self, contractor_id, latitude, longitude, available=None):
+        previous = self._positions.get(contractor_id)
+        if available is None:
+            available = previous is None or contractor_id in self._available
+        if previous is not None and contractor_id in self._available:
+            self._remove_from_cell(contractor_id, *previous)
+        self._positions[contractor_id] = (latitude, longitude)
+        if available:
+            self._available.add(contractor_id)
+            self._add_to_cell(contractor_id, latitude, longitude)
+        else:
+            self._available.discard(contractor_id)
+
+    def set_available(self, contractor_id, available):
+        position = self._positions.get(contractor_id)
+        if position is None or available == (contractor_id in self._available):
+            return
+        if available:
+            self._available.add(contractor_id)
+            self._add_to_cell(contractor_id, *position)
+        else:
+            self._available.discard(contractor_id)
+            self._remove_from_cell(contractor_id, *position)
+
+    def remove(self, contractor_id):
+        position = self._positions.pop(contractor_id, None)
+        if position is not None and contractor_id in self._available:
+            self._available.discard(contractor_id)
+            self._remove_from_cell(contractor_id, *position)
+
+    def add_connection(self, contractor_id):
+        self._connections[contractor_id] = self._connections.get(contractor_id, 0) + 1
+
+    def remove_connection(self, contractor_id):
+        count = self._connections.get(contractor_id, 0) - 1
+        if count > 0:
+            self._connections[contractor_id] = count
+            return
+        self._connections.pop(contractor_id, None)
+        self.remove(contractor_id)
+
+    def nearest(self, latitude, longitude, k, max_distance=None):
+        """
+        Up to ``k`` nearest available contractors as ``(contractor_id,
+        distance_km)`` pairs, closest first.
+        """
+        if k <= 0 or not self._available:
+            return []
+        center_row, center_column = self._get_cell(latitude, longitude)
+        scale = math.cos(math.radians(latitude))
+        cell_km = self.cell_size * KM_PER_DEGREE * max(scale, 1e-6)
+        heap = []
+        seen = 0
+        radius = 0
+        while seen < len(self._available):
+            # Anything in this ring is at least (radius - 1) cells away.
+            bound = max(radius - 1, 0) * cell_km
+            if len(heap) == k and bound > -heap[0][0]:
+                break
+            if max_distance is not None and bound > max_distance:
+                break
+            for row in range(center_row - radius, center_row + radius + 1):
+                edge = row in (center_row - radius, center_row + radius)
+                step = 1 if edge else 2 * radius
+                for column in range(
+                    center_column - radius, center_column + radius + 1, step or 1
+                ):
+                    bucket = self._cells.get((row, column))
+                    if not bucket:
+                        continue
+                    seen += len(bucket)
+                    for contractor_id, (other_latitude, other_longitude) in bucket.items():
+                        x = (other_longitude - longitude) * scale
+                        y = other_latitude - latitude
+                        distance = math.sqrt(x * x + y * y) * KM_PER_DEGREE
+                        if max_distance is not None and distance > max_distance:
+                            continue
+                        if len(heap) < k:
+                            heapq.heappush(heap, (-distance, contractor_id))
+                        elif distance < -heap[0][0]:
+                            heapq.heapreplace(heap, (-distance, contractor_id))
+            radius += 1
+        return sorted(
+            ((contractor_id, -distance) for distance, contractor_id in heap),
+            key=lambda match: match[1]
+        )
+
+
+contractor_index = ContractorIndex(
+    cell_size=settings.CONTRACTOR_INDEX['CELL_SIZE'],
+)
+metrics.registry.collect(
+    'contractor_index_entries', 'Contractors in the spatial index.',
+    lambda: len(contractor_index)
+)
+
+
+def match_contractors(dispatch, k=None, index=None):
+    """
+    The k nearest available contractors within ``MAX_DISTANCE`` km of a
+    dispatch's pickup, or an empty list when the dispatch has no coordinates.
+    """
+    if not dispatch.has_request_coordinates:
+        return []
+    index = contractor_index if index is None else index
+    return index.nearest(
+        dispatch.request_latitude,
+        dispatch.request_longitude,
+        settings.CONTRACTOR_INDEX['K'] if k is None else k,
+        max_distance=settings.CONTRACTOR_INDEX['MAX_DISTANCE'],
+    )
@@ -0,0 +1,75 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from core import escalation, geo
+from core.escalation import Escalator
+
+
+class Layer:
+    def __init__(self):
+        self.sent = []
+
+    async def group_send(self, group, message):
+        self.sent.append((group, message))
+
+
+def make_dispatch(dispatch_id):
+    dispatch = SimpleNamespace(
+        id=dispatch_id,
+        request_latitude=35.6812,
+        request_longitude=139.7671,
+        has_request_coordinates=True,
+    )
+    return dispatch, {'id': dispatch_id}
+
+
+@pytest.fixture
+def unclaimed_ids(monkeypatch):
+    ids = set()
+
+    async def get_unclaimed_ids(dispatch_ids):
+        return ids & set(dispatch_ids)
+    monkeypatch.setattr(escalation, 'get_unclaimed_ids', get_unclaimed_ids)
+    return ids
+
+
+@pytest.mark.asyncio
+class TestEscalator:
+    async def test_widens_one_ring_then_falls_back(self, unclaimed_ids):
+        layer = Layer()
+        escalator = Escalator(max_radius=2, delay=0.01)
+        item = make_dispatch('a')
+        unclaimed_ids.add('a')
+        escalator.submit([item], 1, layer)
+        try:
+            await asyncio.sleep(0.1)
+        finally:
+            escalator.clear()
+
+        ring_groups = {group for group, _ in layer.sent[:-1]}
+        assert ring_groups == set(geo.ring_groups(35.6812, 139.7671, 2))
+        group, message = layer.sent[-1]
+        assert group == 'contractors'
+        assert json.loads(message['text'])['data'] == {'id': 'a'}
+        assert set(message['skip_groups']) == {
+            group
+            for radius in range(3)
+            for group in geo.ring_groups(35.6812, 139.7671, radius)
+        }
+        assert len(escalator) == 0
+
+    async def test_claimed_dispatches_stop_escalating(self, unclaimed_ids):
+        layer = Layer()
+        escalator = Escalator(max_radius=3, delay=0.01)
+        escalator.submit([make_dispatch('a'), make_dispatch('b')], 0, layer)
+        unclaimed_ids.add('b')
+        escalator.discard('b')
+        try:
+            await asyncio.sleep(0.05)
+        finally:
+            escalator.clear()
+        assert layer.sent == []
+        assert len(escalator) == 0
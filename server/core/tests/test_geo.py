@@ -0,0 +1,25 @@
+from core import geo
+
+
+def test_encode():
+    assert geo.encode(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+    assert geo.encode(35.6812, 139.7671, 5) == 'xn76u'
+
+
+def test_ring_sizes():
+    assert geo.ring(35.6812, 139.7671, 0, 5) == {'xn76u'}
+    assert len(geo.ring(35.6812, 139.7671, 1, 5)) == 8
+    assert len(geo.ring(35.6812, 139.7671, 2, 5)) == 16
+
+
+def test_ring_neighbours_are_adjacent():
+    height, width = geo.cell_size(5)
+    cells = geo.ring(35.6812, 139.7671, 1, 5)
+    assert geo.encode(35.6812 + height, 139.7671, 5) in cells
+    assert geo.encode(35.6812, 139.7671 - width, 5) in cells
+    assert 'xn76u' not in cells
+
+
+def test_ring_wraps_around_antimeridian():
+    cells = geo.ring(0.01, 179.99, 1, 5)
+    assert geo.encode(0.01, -179.99, 5) in cells
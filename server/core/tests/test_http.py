@@ -1,6 +1,8 @@
 import base64
 import json
+import warnings
 from django.contrib.auth import get_user_model
+from django.test import override_settings
 from rest_framework import status
 from rest_framework.reverse import reverse
 from rest_framework.test import APITestCase
@@ -9,6 +11,12 @@ from core.models import Dispatch
 
 PASSWORD = 'pAssw0rd!'
 
+TEST_CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    },
+}
+
 
 def create_user(username='user@example.com', password=PASSWORD):
     return get_user_model().objects.create_user(
@@ -53,9 +61,11 @@ class AuthenticationTest(APITestCase):
         self.assertEqual(payload_data['username'], user.username)
         self.assertEqual(payload_data['first_name'], user.first_name)
         self.assertEqual(payload_data['last_name'], user.last_name)
+        self.assertEqual(payload_data['groups'], [])
 
 
 
+@override_settings(CHANNEL_LAYERS=TEST_CHANNEL_LAYERS)
 class HttpCoreTest(APITestCase):
     def setUp(self):
         user = create_user()
@@ -76,3 +86,134 @@ class HttpCoreTest(APITestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(str(dispatch.id), response.data.get('id'))
+
+    def test_user_can_list_own_dispatches_by_page(self):
+        user = get_user_model().objects.get(username='user@example.com')
+        other = create_user(username='other@example.com')
+        dispatches = [
+            Dispatch.objects.create(
+                request_location='A', destination='B', requestor=user
+            )
+            for _ in range(5)
+        ]
+        Dispatch.objects.create(
+            request_location='A', destination='B', requestor=other
+        )
+
+        ids = []
+        url = f"{reverse('core:dispatch_list')}?page_size=2"
+        while url:
+            response = self.client.get(
+                url,
+                HTTP_AUTHORIZATION=f'Bearer {self.access}'
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 2)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        expected = sorted(
+            dispatches, key=lambda dispatch: (dispatch.created_at, dispatch.id),
+            reverse=True
+        )
+        self.assertEqual([str(dispatch.id) for dispatch in expected], ids)
+
+    def test_user_can_filter_dispatches(self):
+        user = get_user_model().objects.get(username='user@example.com')
+        completed = Dispatch.objects.create(
+            request_location='A', destination='B', requestor=user,
+            status=Dispatch.COMPLETED
+        )
+        Dispatch.objects.create(
+            request_location='A', destination='B', requestor=user
+        )
+        response = self.client.get(
+            reverse('core:dispatch_list'),
+            data={'status': Dispatch.COMPLETED},
+            HTTP_AUTHORIZATION=f'Bearer {self.access}'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [str(completed.id)],
+            [item['id'] for item in response.data['results']]
+        )
+
+        response = self.client.get(
+            reverse('core:dispatch_list'),
+            data={'created_after': 'yesterday'},
+            HTTP_AUTHORIZATION=f'Bearer {self.access}'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(
+            reverse('core:dispatch_list'),
+            data={'created_after': '2024-13-01T00:00:00'},
+            HTTP_AUTHORIZATION=f'Bearer {self.access}'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Naive datetimes are read in the current time zone.
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', RuntimeWarning)
+            response = self.client.get(
+                reverse('core:dispatch_list'),
+                data={'created_after': '2000-01-01T00:00:00'},
+                HTTP_AUTHORIZATION=f'Bearer {self.access}'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(2, len(response.data['results']))
+
+    def test_user_can_create_dispatch_batch(self):
+        user = get_user_model().objects.get(username='user@example.com')
+        response = self.client.post(
+            reverse('core:dispatch_batch'),
+            data=[
+                {'request_location': 'A', 'destination': 'B', 'requestor': user.id},
+                {'request_location': 'C', 'destination': 'D', 'requestor': user.id},
+            ],
+            format='json',
+            HTTP_AUTHORIZATION=f'Bearer {self.access}'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(2, len(response.data))
+        self.assertEqual(2, Dispatch.objects.filter(requestor=user).count())
+
+    def test_dispatch_batch_rejects_non_integer_user_ids(self):
+        for requestor in (True, 1.9):
+            response = self.client.post(
+                reverse('core:dispatch_batch'),
+                data=[{'request_location': 'A', 'destination': 'B', 'requestor': requestor}],
+                format='json',
+                HTTP_AUTHORIZATION=f'Bearer {self.access}'
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('requestor', response.data[0])
+        self.assertEqual(0, Dispatch.objects.count())
+
+    @override_settings(DISPATCH_BATCH_MAX_SIZE=2)
+    def test_oversized_dispatch_batch_is_rejected_before_validation(self):
+        # Only authentication queries; no items are validated.
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                reverse('core:dispatch_batch'),
+                data=[{'request_location': 'A', 'requestor': 'x'}] * 3,
+                format='json',
+                HTTP_AUTHORIZATION=f'Bearer {self.access}'
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data['non_field_errors'], ['Batches are limited to 2 dispatches.']
+        )
+
+    def test_dispatch_batch_is_rejected_with_item_errors(self):
+        response = self.client.post(
+            reverse('core:dispatch_batch'),
+            data=[
+                {'request_location': 'A', 'destination': 'B'},
+                {'request_location': 'C'},
+            ],
+            format='json',
+            HTTP_AUTHORIZATION=f'Bearer {self.access}'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual({}, response.data[0])
+        self.assertIn('destination', response.data[1])
+        self.assertEqual(0, Dispatch.objects.count())
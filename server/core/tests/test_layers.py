@@ -0,0 +1,124 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from channels.exceptions import ChannelFull
+
+from core.layers import LocalChannelLayer, RedisChannelLayer, group_send_many
+
+
+class Pipeline:
+    def __init__(self, executed):
+        self.commands = []
+        self.executed = executed
+
+    def __getattr__(self, name):
+        return lambda *args: self.commands.append((name, *args))
+
+    async def execute(self):
+        self.executed.append(self.commands)
+
+
+class Connection:
+    def __init__(self, index, executed):
+        self.index = index
+        self.executed = executed
+
+    def pipeline(self):
+        return Pipeline(self.executed.setdefault(self.index, []))
+
+
+@pytest.mark.asyncio
+class TestRedisChannelLayer:
+    def create_layer(self):
+        layer = RedisChannelLayer(
+            hosts=['redis://first:6379', 'redis://second:6379'], group_expiry=60
+        )
+        executed = {}
+
+        @asynccontextmanager
+        async def connection(index):
+            yield Connection(index, executed)
+
+        layer.connection = connection
+        return layer, executed
+
+    async def test_group_add_many_pipelines_one_round_trip_per_shard(self, monkeypatch):
+        layer, executed = self.create_layer()
+        monkeypatch.setattr('core.layers.time.time', lambda: 100.0)
+        groups = ['one', 'two', 'three', 'four']
+        await layer.group_add_many(groups, 'channel')
+
+        # One pipeline per shard, each with zadd then expire per group.
+        assert all(len(pipelines) == 1 for pipelines in executed.values())
+        commands = {
+            index: pipelines[0] for index, pipelines in executed.items()
+        }
+        for group in groups:
+            group_key = layer._group_key(group)
+            shard = commands[layer.consistent_hash(group)]
+            position = shard.index(('zadd', group_key, 100.0, 'channel'))
+            assert shard[position + 1] == ('expire', group_key, 60)
+        assert sum(len(shard) for shard in commands.values()) == 2 * len(groups)
+
+    async def test_group_discard_many_pipelines_zrem(self):
+        layer, executed = self.create_layer()
+        groups = ['one', 'two', 'three', 'four']
+        await layer.group_discard_many(groups, 'channel')
+
+        assert all(len(pipelines) == 1 for pipelines in executed.values())
+        assert sorted(
+            command for pipelines in executed.values() for command in pipelines[0]
+        ) == sorted(('zrem', layer._group_key(group), 'channel') for group in groups)
+        for index, pipelines in executed.items():
+            assert {
+                layer.consistent_hash(group) for group in groups
+                if ('zrem', layer._group_key(group), 'channel') in pipelines[0]
+            } == {index}
+
+
+@pytest.mark.asyncio
+class TestLocalChannelLayer:
+    async def test_send_and_receive(self):
+        layer = LocalChannelLayer()
+        channel = await layer.new_channel()
+        receive = asyncio.create_task(layer.receive(channel))
+        await asyncio.sleep(0)
+        await layer.send(channel, {'type': 'test.message', 'text': 'hello'})
+        assert await asyncio.wait_for(receive, timeout=1) == {
+            'type': 'test.message', 'text': 'hello',
+        }
+        assert layer.get_stats()['received'] == 1
+
+    async def test_full_channel(self):
+        layer = LocalChannelLayer(capacity=2)
+        await layer.group_add('group', 'channel')
+        await layer.send('channel', {'type': 'test.message'})
+        await layer.send('channel', {'type': 'test.message'})
+        with pytest.raises(ChannelFull):
+            await layer.send('channel', {'type': 'test.message'})
+        await layer.group_send('group', {'type': 'test.message'})
+        stats = layer.get_stats()
+        assert stats['sent'] == 2
+        assert stats['dropped'] == 2
+        assert stats['queued'] == 2
+
+    async def test_messages_expire(self):
+        layer = LocalChannelLayer(expiry=0.05)
+        await layer.send('channel', {'type': 'old.message'})
+        await asyncio.sleep(0.1)
+        await layer.send('channel', {'type': 'new.message'})
+        assert (await layer.receive('channel'))['type'] == 'new.message'
+        assert layer.get_stats()['expired'] == 1
+
+    async def test_group_fan_out(self):
+        layer = LocalChannelLayer()
+        await layer.group_add_many(['one', 'two'], 'first')
+        await layer.group_add('two', 'second')
+        await group_send_many(layer, ['one', 'two'], {'type': 'test.message'})
+        assert layer.get_stats()['sent'] == 3
+
+        await layer.group_discard_many(['one', 'two'], 'first')
+        assert layer.groups == {'two': {'second': layer.groups['two']['second']}}
+        await layer.group_discard('two', 'second')
+        assert layer.groups == {}
@@ -0,0 +1,25 @@
+from core.loadtest import find_regressions, summarize
+
+
+def test_summarize():
+    result = summarize([0.001 * index for index in range(1, 101)], elapsed=2.0)
+    assert result['count'] == 100
+    assert result['throughput'] == 50.0
+    assert round(result['p50_ms']) == 51
+    assert round(result['p99_ms']) == 99
+
+
+def test_find_regressions():
+    baseline = {
+        'handshake': {'p99_ms': 100.0, 'throughput': 1000.0},
+        'fan_out': {'p99_ms': 100.0, 'throughput': 1000.0},
+    }
+    results = {
+        'handshake': {'p99_ms': 115.0, 'throughput': 850.0},
+        'fan_out': {'p99_ms': 130.0, 'throughput': 700.0},
+        'list_dispatches': {'p99_ms': 10.0, 'throughput': 10.0},
+    }
+    assert find_regressions(results, baseline, tolerance=0.2) == [
+        'fan_out: p99 130.0 ms > baseline 100.0 ms',
+        'fan_out: 700/s < baseline 1000/s',
+    ]
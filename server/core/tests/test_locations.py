@@ -0,0 +1,27 @@
+import asyncio
+
+import pytest
+
+from core import locations
+from core.locations import PositionStore
+
+
+@pytest.mark.asyncio
+class TestPositionStore:
+    async def test_failed_flush_keeps_positions_dirty(self, monkeypatch, caplog):
+        persisted = []
+
+        async def persist_positions(positions):
+            if not persisted:
+                persisted.append(None)
+                raise RuntimeError('database is down')
+            persisted.append(dict(positions))
+        monkeypatch.setattr(locations, 'persist_positions', persist_positions)
+
+        store = PositionStore(max_size=10, persist_interval=0.01)
+        store.update(1, 35.68, 139.76)
+        await asyncio.sleep(0.05)
+        assert 'Could not persist contractor positions.' in caplog.text
+
+        await store.flush()
+        assert list(persisted[1]) == [1]
@@ -0,0 +1,87 @@
+import math
+
+import pytest
+
+from core import matching
+from core.matching import (
+    Matcher, assign, distance_matrix, linear_sum_assignment, numpy
+)
+from core.spatial import ContractorIndex
+
+
+def to_lists(matrix):
+    return [list(row) for row in matrix]
+
+
+def test_distance_matrix():
+    matrix = to_lists(distance_matrix(
+        [(35.0, 139.0), (35.1, 139.0)], [(35.0, 139.0), (35.1, 139.0), (35.0, 139.1)]
+    ))
+    assert matrix[0][0] == 0.0
+    assert matrix[0][1] == pytest.approx(11.12, abs=0.01)
+    assert matrix[1][1] == 0.0
+    assert matrix[0][2] == pytest.approx(11.12 * math.cos(math.radians(35.0)), abs=0.01)
+
+
+def test_greedy_assigns_each_row_and_column_once():
+    matrix = distance_matrix(
+        [(35.0, 139.0), (35.01, 139.0), (36.0, 139.0)],
+        [(35.0, 139.001), (35.011, 139.0)],
+    )
+    pairs = sorted(assign(matrix, max_distance=5.0))
+    assert [(row, column) for row, column, _ in pairs] == [(0, 0), (1, 1)]
+
+
+@pytest.mark.parametrize('as_array', [
+    False,
+    pytest.param(True, marks=pytest.mark.skipif(numpy is None, reason='numpy is required')),
+])
+def test_greedy_skips_infeasible_pairs_without_a_limit(as_array):
+    matrix = [[math.inf, 2.0], [math.inf, math.inf]]
+    if as_array:
+        matrix = numpy.array(matrix)
+    assert assign(matrix) == [(0, 1, 2.0)]
+
+
+def test_greedy_array_and_list_paths_agree():
+    matrix = distance_matrix(
+        [(35.0, 139.0), (35.01, 139.0), (35.02, 139.0)],
+        [(35.0, 139.001), (35.011, 139.0), (35.5, 139.0)],
+    )
+    assert assign(matrix, max_distance=5.0) == assign(to_lists(matrix), max_distance=5.0)
+
+
+def test_hungarian_without_scipy_warns(monkeypatch, caplog):
+    monkeypatch.setattr(matching, 'linear_sum_assignment', None)
+    Matcher(
+        window=1.0, solver='hungarian', candidates=5, max_distance=None,
+        offer_timeout=10.0, fallback_after=30.0, index=ContractorIndex(cell_size=0.01)
+    )
+    assert "using 'greedy' instead" in caplog.text
+
+
+@pytest.mark.skipif(
+    numpy is None or linear_sum_assignment is None, reason='numpy and scipy are required'
+)
+def test_hungarian_minimises_total_distance():
+    # Greedy takes the 1-unit pair first and is left with a 10-unit pair.
+    matrix = numpy.array([[1.0, 2.0], [2.0, 10.0]])
+    assert sum(distance for _, _, distance in assign(matrix)) == 11.0
+    assert sum(distance for _, _, distance in assign(matrix, solver='hungarian')) == 4.0
+
+
+def test_matcher_skips_declined_contractors():
+    index = ContractorIndex(cell_size=0.01)
+    index.update(1, 35.6815, 139.7665)
+    index.update(2, 35.6900, 139.7700)
+    matcher = Matcher(
+        window=0, solver='greedy', candidates=5, max_distance=10.0,
+        offer_timeout=15, fallback_after=60, index=index
+    )
+    dispatches = [('a', 35.6812, 139.7671)]
+    assert [match[1] for match in matcher.match(dispatches)] == [1]
+
+    matcher._offers['a'] = (1, math.inf)
+    assert matcher.decline('a', 2) is False
+    assert matcher.decline('a', 1) is True
+    assert [match[1] for match in matcher.match(dispatches)] == [2]
@@ -0,0 +1,110 @@
+import pytest
+
+from core import metrics
+from core.metrics import Registry
+
+
+class TestRegistry:
+    def test_counters_and_gauges_render_with_labels(self):
+        registry = Registry()
+        counter = registry.counter('frames_total', 'Frames.', ('outcome',))
+        gauge = registry.gauge('connections', 'Connections.')
+        counter.inc('sent')
+        counter.inc('sent', amount=2)
+        counter.inc('dropped "late"')
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+        assert registry.render().splitlines() == [
+            '# HELP frames_total Frames.',
+            '# TYPE frames_total counter',
+            'frames_total{outcome="sent"} 3',
+            'frames_total{outcome="dropped \\"late\\""} 1',
+            '# HELP connections Connections.',
+            '# TYPE connections gauge',
+            'connections 1',
+        ]
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = Registry()
+        histogram = registry.histogram(
+            'latency_seconds', 'Latency.', ('type',), buckets=(0.1, 1.0)
+        )
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value, 'claim')
+        assert registry.render().splitlines()[2:] == [
+            'latency_seconds_bucket{type="claim",le="0.1"} 2',
+            'latency_seconds_bucket{type="claim",le="1.0"} 3',
+            'latency_seconds_bucket{type="claim",le="+Inf"} 4',
+            'latency_seconds_sum{type="claim"} 2.65',
+            'latency_seconds_count{type="claim"} 4',
+        ]
+
+    def test_collected_metrics_are_read_when_rendered(self):
+        registry = Registry()
+        entries = {}
+        registry.collect('entries', 'Entries.', lambda: len(entries))
+        registry.collect(
+            'pool', 'Pool.', lambda: {('default', 'idle'): 2},
+            labels=('alias', 'state')
+        )
+        entries['a'] = 1
+        assert registry.render().splitlines() == [
+            '# HELP entries Entries.',
+            '# TYPE entries gauge',
+            'entries 1',
+            '# HELP pool Pool.',
+            '# TYPE pool gauge',
+            'pool{alias="default",state="idle"} 2',
+        ]
+
+    def test_track_message_records_time_and_queries(self):
+        registry = Registry()
+        original = metrics.message_queries
+        metrics.message_queries = registry.histogram(
+            'queries', 'Queries.', ('message_type',), buckets=(0, 1, 2)
+        )
+        try:
+            with metrics.track_message('claim.dispatch'):
+                for _ in range(2):
+                    metrics.count_query(lambda *args: None, 'SELECT 1', (), False, {})
+        finally:
+            metrics.message_queries = original
+        rendered = registry.render()
+        assert 'queries_count{message_type="claim.dispatch"} 1' in rendered
+        assert 'queries_sum{message_type="claim.dispatch"} 2.0' in rendered
+
+
+@pytest.mark.django_db
+class TestMetricsView:
+    def test_hidden_when_disabled(self, client, monkeypatch):
+        monkeypatch.setattr(metrics, 'ENABLED', False)
+        response = client.get('/metrics')
+        assert response.status_code == 404
+
+    def test_requires_staff_or_token(self, client, monkeypatch, settings, django_user_model):
+        monkeypatch.setattr(metrics, 'ENABLED', True)
+        settings.METRICS = {**settings.METRICS, 'TOKEN': 'scrape-secret'}
+        assert client.get('/metrics').status_code == 403
+        assert client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer wrong'
+        ).status_code == 403
+        assert client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret'
+        ).status_code == 200
+        settings.METRICS = {**settings.METRICS, 'TOKEN': ''}
+        assert client.get('/metrics', HTTP_AUTHORIZATION='Bearer ').status_code == 403
+        client.force_login(django_user_model.objects.create_user(
+            username='metrics@example.com', password='pAssw0rd', is_staff=True
+        ))
+        assert client.get('/metrics').status_code == 200
+
+    def test_renders_registry_when_enabled(self, client, monkeypatch, admin_user):
+        monkeypatch.setattr(metrics, 'ENABLED', True)
+        client.force_login(admin_user)
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'text/plain; version=0.0.4'
+        assert '# TYPE dispatch_message_seconds histogram' in response.content.decode()
+        assert '# TYPE websocket_outbound_frames_total counter' in response.content.decode()
+        assert '# TYPE database_pool_connections gauge' in response.content.decode()
@@ -0,0 +1,122 @@
+import datetime
+import uuid
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.ids import uuid7
+from core.models import Dispatch, DispatchEvent, User
+
+
+class DispatchIdTest(TestCase):
+    def test_uuid7_is_time_ordered(self):
+        ids = [uuid7() for _ in range(10000)]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertEqual(ids[0].version, 7)
+        self.assertEqual(ids[0].variant, uuid.RFC_4122)
+
+    def test_new_dispatches_use_uuid7(self):
+        dispatch = Dispatch.objects.create(request_location='A', destination='B')
+        self.assertEqual(dispatch.id.version, 7)
+        self.assertEqual(
+            dispatch.get_absolute_url(), f'/api/dispatch/{dispatch.id}/'
+        )
+
+    @override_settings(DISPATCH_ID_VERSION=4)
+    def test_uuid4_can_be_restored(self):
+        dispatch = Dispatch.objects.create(request_location='A', destination='B')
+        self.assertEqual(dispatch.id.version, 4)
+
+
+class DispatchTransitionTest(TestCase):
+    def test_can_transition(self):
+        self.assertTrue(Dispatch.can_transition(Dispatch.REQUESTED, Dispatch.STARTED))
+        self.assertTrue(Dispatch.can_transition(Dispatch.STARTED, Dispatch.STARTED))
+        self.assertTrue(Dispatch.can_transition(Dispatch.IN_PROGRESS, Dispatch.COMPLETED))
+        self.assertFalse(Dispatch.can_transition(Dispatch.COMPLETED, Dispatch.REQUESTED))
+        self.assertFalse(Dispatch.can_transition(Dispatch.REQUESTED, Dispatch.COMPLETED))
+        self.assertFalse(Dispatch.can_transition(Dispatch.REQUESTED, 'UNKNOWN'))
+
+    def setUp(self):
+        self.contractor = User.objects.create_user(username='driver', password='pAssw0rd')
+
+    def test_transition_is_a_single_update(self):
+        dispatch = Dispatch.objects.create(
+            request_location='A', destination='B', status=Dispatch.STARTED,
+            contractor=self.contractor
+        )
+        with self.assertNumQueries(1):
+            version, updated_at = Dispatch.transition(
+                dispatch.id, Dispatch.IN_PROGRESS, self.contractor.id, expected_version=0
+            )
+        with self.assertNumQueries(1):
+            self.assertIsNone(
+                Dispatch.transition(dispatch.id, Dispatch.STARTED, self.contractor.id)
+            )
+        dispatch.refresh_from_db()
+        self.assertEqual(Dispatch.IN_PROGRESS, dispatch.status)
+        self.assertEqual((1, dispatch.updated_at), (version, updated_at))
+
+        # Without a version the new one is read back.
+        with self.assertNumQueries(2):
+            version, _ = Dispatch.transition(
+                dispatch.id, Dispatch.COMPLETED, self.contractor.id
+            )
+        self.assertEqual(2, version)
+
+    def test_only_the_assigned_contractor_moves_a_claimed_dispatch(self):
+        other = User.objects.create_user(username='other', password='pAssw0rd')
+        requested = Dispatch.objects.create(request_location='A', destination='B')
+        started = Dispatch.objects.create(
+            request_location='A', destination='B', status=Dispatch.STARTED,
+            contractor=self.contractor
+        )
+        self.assertIsNone(
+            Dispatch.transition(requested.id, Dispatch.IN_PROGRESS, self.contractor.id)
+        )
+        self.assertIsNone(
+            Dispatch.transition(started.id, Dispatch.IN_PROGRESS, other.id)
+        )
+        requested.refresh_from_db()
+        started.refresh_from_db()
+        self.assertEqual(Dispatch.REQUESTED, requested.status)
+        self.assertEqual(Dispatch.STARTED, started.status)
+
+
+class DispatchEventPruneTest(TestCase):
+    def test_only_events_of_long_completed_dispatches_are_pruned(self):
+        now = timezone.now()
+        old = now - datetime.timedelta(days=2)
+        dispatches = []
+        for status, updated_at in (
+            (Dispatch.COMPLETED, old),
+            (Dispatch.COMPLETED, now),
+            (Dispatch.IN_PROGRESS, old),
+        ):
+            dispatch = Dispatch.objects.create(
+                request_location='A', destination='B', status=status
+            )
+            # updated_at is set on save; backdate it directly.
+            Dispatch.objects.filter(id=dispatch.id).update(updated_at=updated_at)
+            DispatchEvent.record(dispatch.id, {'type': 'echo.message'})
+            DispatchEvent.record(dispatch.id, {'type': 'echo.message'})
+            dispatches.append(dispatch)
+
+        self.assertEqual(2, DispatchEvent.prune(86400, now=now))
+        self.assertEqual(
+            {dispatches[1].id, dispatches[2].id},
+            set(DispatchEvent.objects.values_list('dispatch_id', flat=True))
+        )
+
+    def test_prune_command(self):
+        dispatch = Dispatch.objects.create(
+            request_location='A', destination='B', status=Dispatch.COMPLETED
+        )
+        DispatchEvent.record(dispatch.id, {'type': 'echo.message'})
+        stdout = StringIO()
+        call_command('prune_dispatch_events', retention=0, stdout=stdout)
+        self.assertEqual('Deleted 1 dispatch events.\n', stdout.getvalue())
+        self.assertFalse(DispatchEvent.objects.exists())
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from core import outbound
+from core.outbound import OutboundQueue
+
+
+class Client:
+    def __init__(self):
+        self.frames = []
+        self.ready = asyncio.Event()
+        self.ready.set()
+
+    async def send(self, text_data, bytes_data):
+        await self.ready.wait()
+        self.frames.append(text_data)
+
+
+@pytest.mark.asyncio
+class TestOutboundQueue:
+    async def test_frames_are_written_in_order(self):
+        client = Client()
+        queue = OutboundQueue(client.send, max_size=10, max_lag=10)
+        for text in ('a', 'b', 'c'):
+            assert queue.put(text)
+        await asyncio.sleep(0)
+        assert client.frames == ['a', 'b', 'c']
+        assert len(queue) == 0
+
+    async def test_queued_states_are_coalesced(self):
+        client = Client()
+        client.ready.clear()
+        queue = OutboundQueue(client.send, max_size=10, max_lag=10)
+        queue.put('blocked')
+        await asyncio.sleep(0)
+        queue.put('full 1', key='dispatch')
+        queue.put('partial 2', key='dispatch', partial=True)
+        queue.put('other', key='other')
+        queue.put('partial 3', key='dispatch', partial=True)
+        assert len(queue) == 3
+        queue.put('full 4', key='dispatch')
+        assert len(queue) == 2
+
+        client.ready.set()
+        await asyncio.sleep(0)
+        assert client.frames == ['blocked', 'other', 'full 4']
+
+    async def test_slow_consumer(self):
+        client = Client()
+        client.ready.clear()
+        queue = OutboundQueue(client.send, max_size=2, max_lag=10)
+        assert queue.put('blocked')
+        await asyncio.sleep(0)
+        assert queue.put('a 1', key='a')
+        assert queue.put('b')
+        # Coalescing a queued state does not grow the queue.
+        assert queue.put('a 2', key='a')
+        assert not queue.put('c')
+        assert queue.slow
+        assert not queue.put('d')
+        queue.close()
+        assert len(queue) == 0
+
+    async def test_failed_write_closes_the_connection(self, caplog):
+        closed = []
+
+        async def send(text_data, bytes_data):
+            raise OSError('Connection reset')
+
+        async def on_error():
+            closed.append(True)
+
+        queued = outbound.stats['queued']
+        queue = OutboundQueue(send, max_size=10, max_lag=10, on_error=on_error)
+        queue.put('a')
+        queue.put('b')
+        await asyncio.sleep(0)
+        assert closed == [True]
+        assert queue.failed
+        assert 'Could not write to the WebSocket.' in caplog.text
+        assert len(queue) == 0
+        assert outbound.stats['queued'] == queued
+        assert not queue.put('c')
@@ -0,0 +1,112 @@
+import threading
+import time
+
+import pytest
+
+from config.backends import pool as pool_backend
+from config.backends.pool import ConnectionPool, PoolTimeout
+from core import metrics
+
+
+class Connection:
+    def __init__(self):
+        self.healthy = True
+        self.closed = False
+
+    def ping(self):
+        if not self.healthy:
+            raise OSError('Connection lost')
+
+    def close(self):
+        self.closed = True
+
+
+def create_pool(**kwargs):
+    return ConnectionPool(
+        connect=Connection, check=lambda connection: connection.ping(), **kwargs
+    )
+
+
+def test_connections_are_reused():
+    pool = create_pool(max_size=2)
+    connection = pool.acquire()
+    pool.release(connection)
+    assert pool.acquire() is connection
+    assert pool.get_stats()['created'] == 1
+    assert pool.get_stats()['in_use'] == 1
+
+
+def test_acquire_waits_for_a_release():
+    pool = create_pool(max_size=1, timeout=0.05)
+    connection = pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+
+    pool.timeout = 5
+    threading.Timer(0.05, pool.release, (connection,)).start()
+    assert pool.acquire() is connection
+    stats = pool.get_stats()
+    assert stats['timeouts'] == 1
+    assert stats['wait_seconds'] > 0.05
+
+
+def test_dead_connections_are_replaced():
+    pool = create_pool(max_size=1, health_check_interval=0)
+    connection = pool.acquire()
+    connection.healthy = False
+    pool.release(connection)
+    replacement = pool.acquire()
+    assert replacement is not connection
+    assert connection.closed
+    assert pool.get_stats()['size'] == 1
+
+
+def test_idle_connections_are_reaped_down_to_min_size():
+    pool = create_pool(min_size=1, max_size=3, max_idle=0)
+    connections = [pool.acquire() for _ in range(3)]
+    for connection in connections:
+        pool.release(connection)
+        time.sleep(0.001)
+    stats = pool.get_stats()
+    assert stats['size'] == 1
+    assert stats['closed'] == 2
+
+
+def test_fill_opens_min_size_connections():
+    pool = create_pool(min_size=2, max_size=3)
+    pool.fill()
+    stats = pool.get_stats()
+    assert stats['idle'] == 2
+    assert stats['created'] == 2
+    pool.acquire()
+    assert pool.get_stats()['created'] == 2
+
+
+def test_idle_connections_are_reaped_on_acquire():
+    pool = create_pool(min_size=1, max_size=3, max_idle=0.01)
+    connections = [pool.acquire() for _ in range(3)]
+    for connection in connections:
+        pool.release(connection)
+    time.sleep(0.02)
+    assert pool.acquire() is connections[-1]
+    stats = pool.get_stats()
+    assert stats['size'] == 1
+    assert stats['closed'] == 2
+    assert connections[0].closed and connections[1].closed
+
+
+def test_pool_stats_are_exported(monkeypatch):
+    pool = create_pool(max_size=2)
+    monkeypatch.setattr(pool_backend, 'pools', {('default', ''): pool})
+    pool.release(pool.acquire())
+    pool.discard(pool.acquire())
+    rendered = metrics.registry.render().splitlines()
+    for line in (
+        'database_pool_acquisitions_total{alias="default"} 2',
+        'database_pool_connections_created_total{alias="default"} 1',
+        'database_pool_connections_closed_total{alias="default"} 1',
+        'database_pool_timeouts_total{alias="default"} 0',
+        'database_pool_connections{alias="default",state="idle"} 0',
+    ):
+        assert line in rendered
+    assert '# TYPE database_pool_wait_seconds_total counter' in rendered
@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+
+from core.models import Dispatch
+from core.serializers import DispatchReadSerializer, NestedDispatchSerializer
+
+
+class DispatchReadSerializerTest(APITestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            username='user@example.com',
+            first_name='Test',
+            last_name='User',
+            password='pAssw0rd!',
+        )
+        Dispatch.objects.create(
+            request_location='A',
+            destination='B',
+            request_latitude=35.6812,
+            request_longitude=139.7671,
+            requestor=user,
+        )
+        Dispatch.objects.create(
+            request_location='C',
+            destination='D',
+            status=Dispatch.STARTED,
+            requestor=user,
+            contractor=user,
+        )
+        self.queryset = Dispatch.objects.order_by('created_at', 'id')
+
+    def test_matches_nested_serializer(self):
+        expected = NestedDispatchSerializer(self.queryset, many=True).data
+        related = self.queryset.select_related('requestor', 'contractor')
+        with self.assertNumQueries(1):
+            data = DispatchReadSerializer(related, many=True).data
+        self.assertEqual(
+            [dict(item) for item in expected],
+            [dict(item) for item in data],
+        )
+
+    def test_from_queryset_matches_nested_serializer(self):
+        expected = NestedDispatchSerializer(self.queryset, many=True).data
+        with self.assertNumQueries(1):
+            data = DispatchReadSerializer.from_queryset(self.queryset)
+        self.assertEqual(
+            [dict(item) for item in expected],
+            data,
+        )
@@ -0,0 +1,68 @@
+import math
+import random
+
+from core.models import Dispatch
+from core.spatial import KM_PER_DEGREE, ContractorIndex, match_contractors
+
+
+def brute_force(positions, latitude, longitude, k):
+    scale = math.cos(math.radians(latitude))
+    distances = sorted(
+        (math.hypot((other_longitude - longitude) * scale, other_latitude - latitude) * KM_PER_DEGREE, contractor_id)
+        for contractor_id, (other_latitude, other_longitude) in positions.items()
+    )
+    return [contractor_id for _, contractor_id in distances[:k]]
+
+
+def test_nearest_matches_brute_force():
+    generator = random.Random(7)
+    index = ContractorIndex(cell_size=0.01)
+    positions = {}
+    for contractor_id in range(2000):
+        positions[contractor_id] = (
+            35.5 + generator.random() * 0.5, 139.5 + generator.random() * 0.5
+        )
+        index.update(contractor_id, *positions[contractor_id])
+    for _ in range(50):
+        latitude = 35.4 + generator.random() * 0.7
+        longitude = 139.4 + generator.random() * 0.7
+        matches = index.nearest(latitude, longitude, 5)
+        assert [contractor_id for contractor_id, _ in matches] == brute_force(
+            positions, latitude, longitude, 5
+        )
+
+
+def test_nearest_skips_unavailable_and_moved_contractors():
+    index = ContractorIndex(cell_size=0.01)
+    index.update(1, 35.681, 139.767)
+    index.update(2, 35.690, 139.770)
+    index.update(3, 35.700, 139.780, available=False)
+    index.set_available(1, False)
+    index.update(2, 36.500, 140.500)
+    assert [match[0] for match in index.nearest(35.68, 139.76, 3)] == [2]
+    assert index.nearest(35.68, 139.76, 3, max_distance=5.0) == []
+
+    index.set_available(3, True)
+    index.remove(2)
+    assert [match[0] for match in index.nearest(35.68, 139.76, 3)] == [3]
+
+
+def test_contractor_stays_indexed_until_last_connection_closes():
+    index = ContractorIndex(cell_size=0.01)
+    index.add_connection(1)
+    index.add_connection(1)
+    index.update(1, 35.681, 139.767)
+    index.remove_connection(1)
+    assert [match[0] for match in index.nearest(35.68, 139.76, 1)] == [1]
+    index.remove_connection(1)
+    assert 1 not in index
+    assert index.nearest(35.68, 139.76, 1) == []
+
+
+def test_match_contractors_for_dispatch():
+    index = ContractorIndex(cell_size=0.01)
+    index.update(1, 35.6815, 139.7665)
+    index.update(2, 51.5072, -0.1276)
+    dispatch = Dispatch(request_latitude=35.6812, request_longitude=139.7671)
+    assert [match[0] for match in match_contractors(dispatch, 1, index)] == [1]
+    assert match_contractors(Dispatch(), 1, index) == []
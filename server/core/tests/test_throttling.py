@@ -0,0 +1,40 @@
+from core import db
+from core.throttling import AdmissionController, RateLimiter
+
+
+class TestRateLimiter:
+    def test_burst_then_refill(self):
+        limiter = RateLimiter({'create.dispatch': (2, 3)})
+        assert [limiter.allow('a', 'create.dispatch', now=0.0) for _ in range(4)] == [
+            True, True, True, False,
+        ]
+        assert limiter.allow('a', 'create.dispatch', now=0.25) is False
+        assert limiter.allow('a', 'create.dispatch', now=0.5) is True
+        assert limiter.allow('a', 'create.dispatch', now=0.5) is False
+
+    def test_buckets_are_per_key_and_message_type(self):
+        limiter = RateLimiter({'create.dispatch': (1, 1), '*': (1, 1)})
+        assert limiter.allow('a', 'create.dispatch', now=0.0) is True
+        assert limiter.allow('b', 'create.dispatch', now=0.0) is True
+        assert limiter.allow('a', 'update.dispatch', now=0.0) is True
+        assert limiter.allow('a', 'create.dispatch', now=0.0) is False
+
+    def test_types_without_a_rate_are_not_limited(self):
+        limiter = RateLimiter({'create.dispatch': (1, 1)})
+        assert all(limiter.allow('a', 'location.update', now=0.0) for _ in range(10))
+
+    def test_refilled_buckets_are_pruned(self):
+        limiter = RateLimiter({'*': (1, 1)}, prune_interval=10.0)
+        limiter.allow('a', 'claim.dispatch', now=0.0)
+        assert len(limiter) == 1
+        limiter.allow('b', 'claim.dispatch', now=limiter._next_prune)
+        assert len(limiter) == 1
+
+
+class TestAdmissionController:
+    def test_sheds_while_database_calls_pile_up(self, monkeypatch):
+        admission = AdmissionController(max_pending=2)
+        monkeypatch.setattr(db, '_pending', 1)
+        assert admission.admit() is True
+        monkeypatch.setattr(db, '_pending', 2)
+        assert admission.admit() is False
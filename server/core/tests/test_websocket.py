@@ -1,3 +1,7 @@
+import asyncio
+import json
+
+import msgpack
 import pytest
 from channels.db import database_sync_to_async
 from channels.layers import get_channel_layer
@@ -6,8 +10,16 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
 from rest_framework_simplejwt.tokens import AccessToken
 
+from config import middleware
+from config.middleware import token_denylist, user_cache
 from config.routing import application
-from core.models import Dispatch
+from core import geo
+from core.escalation import escalator
+from core.locations import position_store
+from core.matching import matcher
+from core.models import ContractorLocation, Dispatch, DispatchEvent
+from core.serializers import DispatchReadSerializer, LogInSerializer
+from core.spatial import contractor_index
 
 TEST_CHANNEL_LAYERS = {
     'default': {
@@ -35,6 +47,11 @@ def create_user(
     return user, access
 
 
+@database_sync_to_async
+def create_log_in_token(user):
+    return LogInSerializer.get_token(user).access_token
+
+
 @database_sync_to_async
 def create_dispatch(
     request_location='123 Main Street',
@@ -52,6 +69,12 @@ def create_dispatch(
     )
 
 
+@database_sync_to_async
+def deactivate_user(user):
+    user.is_active = False
+    user.save()
+
+
 @pytest.mark.asyncio
 @pytest.mark.django_db(transaction=True)
 class TestWebSocket:
@@ -117,6 +140,119 @@ class TestWebSocket:
         assert connected is False
         await communicator.disconnect()
 
+    async def test_reconnect_uses_cached_user(self, settings):
+        settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
+        user, access = await create_user(
+            'test.user@example.com', 'pAssw0rd', 'contractor'
+        )
+        communicator = WebsocketCommunicator(
+            application=application,
+            path=f'/dispatch/?token={access}'
+        )
+        await communicator.connect()
+        await communicator.disconnect()
+
+        cached_user, group_names = user_cache.get(
+            (user.id, access['jti'], access['exp'])
+        )
+        assert cached_user.id == user.id
+        assert group_names == ('contractor',)
+
+    async def test_cannot_connect_after_deactivation(self, settings):
+        settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
+        user, access = await create_user(
+            'test.user@example.com', 'pAssw0rd'
+        )
+        communicator = WebsocketCommunicator(
+            application=application,
+            path=f'/dispatch/?token={access}'
+        )
+        connected, _ = await communicator.connect()
+        assert connected is True
+        await communicator.disconnect()
+
+        await deactivate_user(user)
+        communicator = WebsocketCommunicator(
+            application=application,
+            path=f'/dispatch/?token={access}'
+        )
+        connected, _ = await communicator.connect()
+        assert connected is False
+        await communicator.disconnect()
+
+    async def test_stateless_handshake_skips_user_lookup(self, settings, monkeypatch):
+        settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
+        settings.WEBSOCKET_STATELESS_AUTH = {'ENABLED': True}
+        user, _ = await create_user(
+            'test.user@example.com', 'pAssw0rd', 'contractor'
+        )
+        # As if the group had been added well before this log in.
+        token_denylist.clear()
+        access = await create_log_in_token(user)
+
+        async def load_user(user_id):
+            raise AssertionError('User was loaded from the database.')
+        monkeypatch.setattr(middleware, 'load_user', load_user)
+
+        communicator = WebsocketCommunicator(
+            application=application,
+            path=f'/dispatch/?token={access}'
+        )
+        connected, _ = await communicator.connect()
+        assert connected is True
+        channel_layer = get_channel_layer()
+        assert len(channel_layer.groups.get('contractors', {})) == 1
+        await communicator.disconnect()
+
+    async def test_stateless_handshake_loads_user_after_group_change(self, settings):
+        settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
+        settings.WEBSOCKET_STATELESS_AUTH = {'ENABLED': True}
+        # The group is added and the token issued within the same second.
+        user, _ = await create_user(
+            'test.user@example.com', 'pAssw0rd', 'contractor'
+        )
+        access = await create_log_in_token(user)
+        assert token_denylist.is_stale(access)
+        communicator = WebsocketCommunicator(
+            application=application,
+            path=f'/dispatch/?token={access}'
+        )
+        connected, _ = await communicator.connect()
+        assert connected is True
+        channel_layer = get_channel_layer()
+        assert len(channel_layer.groups.get('contractors', {})) == 1
+        await communicator.disconnect()
+
+    async def test_revoked_token_is_refused(self, settings):
+        settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
+        _, access = await create_user(
+            'test.user@example.com', 'pAssw0rd'
+        )
+        token_denylist.revoke_token(access['jti'], access['exp'])
+        communicator = WebsocketCommunicator(
+            application=application,
+            path=f'/dispatch/?token={access}'
+        )
+        connected, _ = await communicator.connect()
+        assert connected is False
+        await communicator.disconnect()
+
+    async def test_stateless_handshake_rejects_deactivated_user(self, settings):
+        settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
+        settings.WEBSOCKET_STATELESS_AUTH = {'ENABLED': True}
+        user, _ = await create_user(
+            'test.user@example.com', 'pAssw0rd'
+        )
+        access = await create_log_in_token(user)
+        await deactivate_user(user)
+        communicator = WebsocketCommunicator(
+            application=application,
+            path=f'/dispatch/?token={access}'
+        )
+        connected, _ = await communicator.connect()
+        assert connected is False
+        await communicator.disconnect()
+
     async def test_join_contractor_pool(self, settings):
         settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
         _, access = await create_user(
@@ -194,9 +330,10 @@ class TestWebSocket:
             },
         })
 
-        # Receive JSON message from server on test channel.
+        # Receive pre-encoded JSON message from server on test channel.
         response = await channel_layer.receive('test_channel')
-        response_data = response.get('data')
+        assert response['type'] == 'echo.encoded'
+        response_data = json.loads(response['text']).get('data')
 
         assert response_data['id'] is not None
         assert response_data['requestor']['username'] == user.username
@@ -204,6 +341,308 @@ class TestWebSocket:
 
         await communicator.disconnect()
 
+    async def test_nearby_contractor_alerted_on_request(self, settings):
+        settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
+        _, contractor_access = await create_user(
+            'test.driver@example.com', 'pAssw0rd', 'contractor'
+        )
+        contractor_communicator = WebsocketCommunicator(
+            application=application,
+            path=(
+                f'/dispatch/?token={contractor_access}'
+                '&latitude=35.6812&longitude=139.7671'
+            )
+        )
+        await contractor_communicator.connect()
+
+        # Listen to a cell on the other side of the world.
+        channel_layer = get_channel_layer()
+        await channel_layer.group_add(
+            group=geo.contractor_group(51.5072, -0.1276),
+            channel='test_channel'
+        )
+
+        user, access = await create_user(
+            'test.user@example.com', 'pAssw0rd', 'requestor'
+        )
+        communicator = WebsocketCommunicator(
+            application=application,
+            path=f'/dispatch/?token={access}'
+        )
+        await communicator.connect()
+        await communicator.send_json_to({
+            'type': 'create.dispatch',
+            'data': {
+                'request_location': '1 Marunouchi',
+                'destination': '456 Piney Road',
+                'request_latitude': 35.6815,
+                'request_longitude': 139.7665,
+                'requestor': user.id,
+            },
+        })
+
+        response = await contractor_communicator.receive_json_from()
+        assert response['data']['request_latitude'] == 35.6815
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(
+                channel_layer.receive('test_channel'), timeout=0.1
+            )
+
+        await communicator.disconnect()
+        await contractor_communicator.disconnect()
+
+    async def test_escalation_outlives_requestor_and_skips_alerted_cells(
+        self, settings, monkeypatch
+    ):
+        settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
+        settings.DISPATCH_GEO = {**settings.DISPATCH_GEO, 'RADIUS': 0}
+        monkeypatch.setattr(escalator, 'max_radius', 0)
+        monkeypatch.setattr(escalator, 'delay', 0.05)
+        contractors = []
+        for username, position in (
+            ('near.driver@example.com', '&latitude=35.6812&longitude=139.7671'),
+            ('unlocated.driver@example.com', ''),
+        ):
+            _, contractor_access = await create_user(
+                username, 'pAssw0rd', 'contractor'
+            )
+            contractor_communicator = WebsocketCommunicator(
+                application=application,
+                path=f'/dispatch/?token={contractor_access}{position}'
+            )
+            await contractor_communicator.connect()
+            contractors.append(contractor_communicator)
+        near, unlocated = contractors
+
+        user, access = await create_user(
+            'test.user@example.com', 'pAssw0rd', 'requestor'
+        )
+        communicator = WebsocketCommunicator(
+            application=application,
+            path=f'/dispatch/?token={access}'
+        )
+        await communicator.connect()
+        await communicator.send_json_to({
+            'type': 'create.dispatch',
+            'data': {
+                'request_location': '1 Marunouchi',
+                'destination': '456 Piney Road',
+                'request_latitude': 35.6815,
+                'request_longitude': 139.7665,
+                'requestor': user.id,
+            },
+        })
+        await communicator.receive_json_from()
+        await communicator.disconnect()
+
+        response = await near.receive_json_from()
+        dispatch_id = response['data']['id']
+        # The fallback reaches contractors outside the alerted cells only.
+        response = await unlocated.receive_json_from(timeout=1)
+        assert response['data']['id'] == dispatch_id
+        assert await near.receive_nothing(timeout=0.2)
+        for contractor_communicator in contractors:
+            await contractor_communicator.disconnect()
+
+    async def test_matcher_offers_dispatch_to_nearest_contractor(
+        self, settings, monkeypatch
+    ):
+        settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
+        settings.DISPATCH_MATCHER = {**settings.DISPATCH_MATCHER, 'ENABLED': True}
+        monkeypatch.setattr(matcher, 'window', 0.05)
+        contractors = []
+        for username, position in (
+            ('near.driver@example.com', '&latitude=35.6812&longitude=139.7671'),
+            ('far.driver@example.com', '&latitude=35.7000&longitude=139.7800'),
+        ):
+            _, contractor_access = await create_user(
+                username, 'pAssw0rd', 'contractor'
+            )
+            contractor_communicator = WebsocketCommunicator(
+                application=application,
+                path=f'/dispatch/?token={contractor_access}{position}'
+            )
+            await contractor_communicator.connect()
+            contractors.append(contractor_communicator)
+        near, far = contractors
+
+        user, access = await create_user(
+            'test.user@example.com', 'pAssw0rd', 'requestor'
+        )
+        communicator = WebsocketCommunicator(
+            application=application,
+            path=f'/dispatch/?token={access}'
+        )
+        await communicator.connect()
+        try:
+            await communicator.send_json_to({
+                'type': 'create.dispatch',
+                'data': {
+                    'request_location': '1 Marunouchi',
+                    'destination': '456 Piney Road',
+                    'request_latitude': 35.6815,
+                    'request_longitude': 139.7665,
+                    'requestor': user.id,
+                },
+            })
+            dispatch_id = (await communicator.receive_json_from())['data']['id']
+
+            # Only the nearest contractor is offered the dispatch.
+            response = await near.receive_json_from()
+            assert response['type'] == 'dispatch.offer'
+            assert response['data']['id'] == dispatch_id
+            assert await far.receive_nothing(timeout=0.1)
+
+            # Once declined, it goes to the next nearest contractor.
+            await near.send_json_to({
+                'type': 'decline.dispatch',
+                'data': {'id': dispatch_id},
+            })
+            response = await far.receive_json_from()
+            assert response['type'] == 'dispatch.offer'
+            assert response['data']['id'] == dispatch_id
+            assert await near.receive_nothing(timeout=0.1)
+        finally:
+            matcher.clear()
+            await communicator.disconnect()
+            for contractor_communicator in contractors:
+                await contractor_communicator.disconnect()
+
+    async def test_request_trip_batch(self, settings):
+        settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
+
+        # Listen to the 'contractors' group test channel.
+        channel_layer = get_channel_layer()
+        await channel_layer.group_add(
+            group='contractors',
+            channel='test_channel'
+        )
+
+        user, access = await create_user(
+            'test.user@example.com', 'pAssw0rd', 'requestor'
+        )
+        communicator = WebsocketCommunicator(
+            application=application,
+            path=f'/dispatch/?token={access}'
+        )
+        await communicator.connect()
+        await communicator.send_json_to({
+            'type': 'create.dispatch.batch',
+            'data': [
+                {
+                    'request_location': f'{number} Main Street',
+                    'destination': '456 Piney Road',
+                    'requestor': user.id,
+                }
+                for number in range(3)
+            ],
+        })
+        response = await communicator.receive_json_from()
+        assert response['type'] == 'echo.batch'
+        assert [item['request_location'] for item in response['data']] == [
+            '0 Main Street', '1 Main Street', '2 Main Street',
+        ]
+        assert response['data'][0]['requestor']['username'] == user.username
+
+        # Contractors get the whole batch in one message.
+        message = await channel_layer.receive('test_channel')
+        assert len(json.loads(message['text'])['data']) == 3
+
+        await communicator.disconnect()
+
+    async def test_request_trip_batch_reports_item_errors(self, settings):
+        settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
+        user, access = await create_user(
+            'test.user@example.com', 'pAssw0rd', 'requestor'
+        )
+        communicator = WebsocketCommunicator(
+            application=application,
+            path=f'/dispatch/?token={access}'
+        )
+        await communicator.connect()
+        await communicator.send_json_to({
+            'type': 'create.dispatch.batch',
+            'data': [
+                {
+                    'request_location': '123 Main Street',
+                    'destination': '456 Piney Road',
+                    'requestor': user.id,
+                },
+                {
+                    'request_location': '123 Main Street',
+                    'requestor': user.id,
+                },
+            ],
+        })
+        response = await communicator.receive_json_from()
+        assert response['type'] == 'error'
+        errors = response['data']['detail']
+        assert errors[0] == {}
+        assert 'destination' in errors[1]
+        assert await database_sync_to_async(Dispatch.objects.count)() == 0
+        await communicator.disconnect()
+
+    async def test_messages_over_rate_limit_are_refused(self, settings):
+        settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
+        settings.WEBSOCKET_RATE_LIMITS = {
+            'CONNECTION': {'create.dispatch': (0.01, 1)},
+            'USER': {},
+        }
+        user, access = await create_user(
+            'test.user@example.com', 'pAssw0rd', 'requestor'
+        )
+        communicator = WebsocketCommunicator(
+            application=application,
+            path=f'/dispatch/?token={access}'
+        )
+        await communicator.connect()
+        for _ in range(2):
+            await communicator.send_json_to({
+                'type': 'create.dispatch',
+                'data': {
+                    'request_location': '123 Main Street',
+                    'destination': '456 Piney Road',
+                    'requestor': user.id,
+                },
+            })
+        response = await communicator.receive_json_from()
+        assert response['type'] == 'echo.message'
+        response = await communicator.receive_json_from()
+        assert response == {
+            'type': 'error',
+            'data': {
+                'message_type': 'create.dispatch',
+                'detail': 'Rate limit exceeded for this connection.',
+            },
+        }
+        assert await database_sync_to_async(Dispatch.objects.count)() == 1
+        await communicator.disconnect()
+
+    async def test_database_messages_are_shed_when_overloaded(self, settings):
+        settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
+        settings.WEBSOCKET_ADMISSION = {'MAX_PENDING': 0}
+        user, access = await create_user(
+            'test.user@example.com', 'pAssw0rd', 'requestor'
+        )
+        communicator = WebsocketCommunicator(
+            application=application,
+            path=f'/dispatch/?token={access}'
+        )
+        await communicator.connect()
+        await communicator.send_json_to({
+            'type': 'create.dispatch',
+            'data': {
+                'request_location': '123 Main Street',
+                'destination': '456 Piney Road',
+                'requestor': user.id,
+            },
+        })
+        response = await communicator.receive_json_from()
+        assert response['type'] == 'error'
+        assert response['data']['detail'] == 'Server is busy, try again later.'
+        assert await database_sync_to_async(Dispatch.objects.count)() == 0
+        await communicator.disconnect()
+
     async def test_create_dispatch_group(self, settings):
         settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
         user, access = await create_user(
@@ -267,6 +706,23 @@ class TestWebSocket:
 
         await communicator.disconnect()
 
+    async def test_leave_trip_groups_on_disconnect(self, settings):
+        settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
+        user, access = await create_user(
+            'test.user@example.com', 'pAssw0rd', 'requestor'
+        )
+        dispatch = await create_dispatch(requestor=user)
+        communicator = WebsocketCommunicator(
+            application=application,
+            path=f'/dispatch/?token={access}'
+        )
+        await communicator.connect()
+        channel_layer = get_channel_layer()
+        assert len(channel_layer.groups.get(f'{dispatch.id}', {})) == 1
+
+        await communicator.disconnect()
+        assert len(channel_layer.groups.get(f'{dispatch.id}', {})) == 0
+
     async def test_contractor_can_update_dispatch(self, settings):
         settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
 
@@ -307,9 +763,447 @@ class TestWebSocket:
 
         # Rider receives message.
         response = await channel_layer.receive('test_channel')
-        response_data = response.get('data')
+        response_data = json.loads(response['text']).get('data')
         assert response_data['id'] == dispatch_id
         assert response_data['requestor']['username'] == requestor.username
         assert response_data['contractor']['username'] == contractor.username
 
         await communicator.disconnect()
+
+    async def test_only_one_contractor_can_claim_dispatch(self, settings):
+        settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
+        requestor, _ = await create_user(
+            'test.rider@example.com', 'pAssw0rd', 'requestor'
+        )
+        dispatch = await create_dispatch(requestor=requestor)
+        dispatch_id = f'{dispatch.id}'
+
+        communicators = []
+        for username in ('test.driver1@example.com', 'test.driver2@example.com'):
+            _, access = await create_user(username, 'pAssw0rd', 'contractor')
+            communicator = WebsocketCommunicator(
+                application=application,
+                path=f'/dispatch/?token={access}'
+            )
+            await communicator.connect()
+            communicators.append(communicator)
+
+        for communicator in communicators:
+            await communicator.send_json_to({
+                'type': 'claim.dispatch',
+                'data': {'id': dispatch_id},
+            })
+        responses = [
+            await communicator.receive_json_from()
+            for communicator in communicators
+        ]
+        assert sorted(response['type'] for response in responses) == [
+            'claim.rejected', 'echo.message',
+        ]
+        winner = next(
+            response for response in responses
+            if response['type'] == 'echo.message'
+        )
+        assert winner['data']['status'] == Dispatch.STARTED
+        assert winner['data']['version'] == 1
+
+        for communicator in communicators:
+            await communicator.disconnect()
+
+    async def test_stale_update_is_rejected(self, settings):
+        settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
+        requestor, _ = await create_user(
+            'test.rider@example.com', 'pAssw0rd', 'requestor'
+        )
+        dispatch = await create_dispatch(requestor=requestor)
+        contractor, access = await create_user(
+            'test.driver@example.com', 'pAssw0rd', 'contractor'
+        )
+        communicator = WebsocketCommunicator(
+            application=application,
+            path=f'/dispatch/?token={access}'
+        )
+        await communicator.connect()
+        message = {
+            'type': 'update.dispatch',
+            'data': {
+                'id': f'{dispatch.id}',
+                'request_location': dispatch.request_location,
+                'destination': dispatch.destination,
+                'status': Dispatch.STARTED,
+                'contractor': contractor.id,
+                'version': 0,
+            },
+        }
+        await communicator.send_json_to(message)
+        response = await communicator.receive_json_from()
+        assert response['data']['version'] == 1
+
+        # A second update based on version 0 lost the race.
+        await communicator.send_json_to(message)
+        response = await communicator.receive_json_from()
+        assert response['type'] == 'error'
+        assert response['data']['message_type'] == 'update.dispatch'
+
+        # Malformed versions and ids are refused and the socket stays open.
+        for data in (
+            {'id': f'{dispatch.id}', 'destination': 'Elsewhere', 'version': 'abc'},
+            {'id': 'abc', 'destination': 'Elsewhere'},
+        ):
+            await communicator.send_json_to({'type': 'update.dispatch', 'data': data})
+            response = await communicator.receive_json_from()
+            assert response['data'] == {
+                'message_type': 'update.dispatch',
+                'detail': 'Invalid dispatch ID or version.',
+            }
+        await communicator.send_json_to({
+            'type': 'update.dispatch',
+            'data': {'id': f'{dispatch.id}', 'destination': 'Elsewhere', 'version': 1},
+        })
+        response = await communicator.receive_json_from()
+        assert response['data']['destination'] == 'Elsewhere'
+
+        await communicator.disconnect()
+
+    async def test_contractor_can_send_status_update(self, settings):
+        settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
+        requestor, _ = await create_user(
+            'test.rider@example.com', 'pAssw0rd', 'requestor'
+        )
+        contractor, access = await create_user(
+            'test.driver@example.com', 'pAssw0rd', 'contractor'
+        )
+        dispatch = await create_dispatch(
+            status=Dispatch.STARTED, requestor=requestor, contractor=contractor
+        )
+        communicator = WebsocketCommunicator(
+            application=application,
+            path=f'/dispatch/?token={access}'
+        )
+        await communicator.connect()
+        await communicator.send_json_to({
+            'type': 'update.dispatch',
+            'data': {
+                'id': f'{dispatch.id}',
+                'status': Dispatch.IN_PROGRESS,
+                'version': 0,
+            },
+        })
+        response = await communicator.receive_json_from()
+        assert response.pop('seq') > 0
+        dispatch = await database_sync_to_async(Dispatch.objects.get)(id=dispatch.id)
+        assert response == {
+            'type': 'echo.message',
+            'data': {
+                'id': f'{dispatch.id}',
+                'status': Dispatch.IN_PROGRESS,
+                'version': 1,
+                'updated_at': DispatchReadSerializer.datetime_field.to_representation(
+                    dispatch.updated_at
+                ),
+            },
+            'partial': True,
+        }
+        assert dispatch.status == Dispatch.IN_PROGRESS
+        # The same update, relayed through the dispatch group.
+        response = await communicator.receive_json_from()
+        assert response['data']['version'] == 1
+
+        # Pings without a version still carry the new one.
+        await communicator.send_json_to({
+            'type': 'update.dispatch',
+            'data': {'id': f'{dispatch.id}', 'status': Dispatch.COMPLETED},
+        })
+        response = await communicator.receive_json_from()
+        assert response['data']['version'] == 2
+        await communicator.disconnect()
+
+    async def test_status_update_requires_the_assigned_contractor(self, settings):
+        settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
+        requestor, requestor_access = await create_user(
+            'test.rider@example.com', 'pAssw0rd', 'requestor'
+        )
+        contractor, _ = await create_user(
+            'test.driver@example.com', 'pAssw0rd', 'contractor'
+        )
+        _, other_access = await create_user(
+            'test.other@example.com', 'pAssw0rd', 'contractor'
+        )
+        requested = await create_dispatch(requestor=requestor)
+        started = await create_dispatch(
+            status=Dispatch.STARTED, requestor=requestor, contractor=contractor
+        )
+        for access, dispatch in (
+            (requestor_access, requested),
+            (other_access, requested),
+            (other_access, started),
+        ):
+            communicator = WebsocketCommunicator(
+                application=application,
+                path=f'/dispatch/?token={access}'
+            )
+            await communicator.connect()
+            await communicator.send_json_to({
+                'type': 'update.dispatch',
+                'data': {'id': f'{dispatch.id}', 'status': Dispatch.IN_PROGRESS},
+            })
+            response = await communicator.receive_json_from()
+            assert response['type'] == 'error'
+            await communicator.disconnect()
+        statuses = await database_sync_to_async(dict)(
+            Dispatch.objects.values_list('id', 'status')
+        )
+        assert statuses == {
+            requested.id: Dispatch.REQUESTED, started.id: Dispatch.STARTED,
+        }
+
+    async def test_reconnect_replays_missed_updates(self, settings):
+        settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
+        requestor, requestor_access = await create_user(
+            'test.rider@example.com', 'pAssw0rd', 'requestor'
+        )
+        contractor, access = await create_user(
+            'test.driver@example.com', 'pAssw0rd', 'contractor'
+        )
+        dispatch = await create_dispatch(
+            status=Dispatch.STARTED, requestor=requestor, contractor=contractor
+        )
+
+        # The requestor is offline while the contractor sends two updates.
+        communicator = WebsocketCommunicator(
+            application=application,
+            path=f'/dispatch/?token={access}'
+        )
+        await communicator.connect()
+        for status in (Dispatch.IN_PROGRESS, Dispatch.COMPLETED):
+            await communicator.send_json_to({
+                'type': 'update.dispatch',
+                'data': {'id': f'{dispatch.id}', 'status': status},
+            })
+            await communicator.receive_json_from()
+        await communicator.disconnect()
+        seqs = await database_sync_to_async(list)(
+            DispatchEvent.objects.filter(dispatch=dispatch).order_by(
+                'seq'
+            ).values_list('seq', flat=True)
+        )
+        assert len(seqs) == 2
+
+        # The dispatch was completed meanwhile and is still caught up on.
+        requestor_communicator = WebsocketCommunicator(
+            application=application,
+            path=(
+                f'/dispatch/?token={requestor_access}'
+                f'&last_seq={dispatch.id}:{seqs[0]}'
+            )
+        )
+        await requestor_communicator.connect()
+        response = await requestor_communicator.receive_json_from()
+        assert response['seq'] == seqs[1]
+        assert response['data']['status'] == Dispatch.COMPLETED
+        assert await requestor_communicator.receive_nothing(timeout=0.1)
+        await requestor_communicator.disconnect()
+
+    async def test_resumed_dispatches_are_capped(self, settings):
+        settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
+        settings.DISPATCH_EVENTS = {**settings.DISPATCH_EVENTS, 'MAX_RESUMED': 1}
+        requestor, access = await create_user(
+            'test.rider@example.com', 'pAssw0rd', 'requestor'
+        )
+        dispatches = []
+        for _ in range(2):
+            dispatch = await create_dispatch(
+                status=Dispatch.COMPLETED, requestor=requestor
+            )
+            await database_sync_to_async(DispatchEvent.record)(dispatch.id, {
+                'type': 'echo.message',
+                'data': {'id': f'{dispatch.id}'},
+            })
+            dispatches.append(dispatch)
+
+        communicator = WebsocketCommunicator(
+            application=application,
+            path=(
+                f'/dispatch/?token={access}'
+                f'&last_seq={dispatches[0].id}:0&last_seq={dispatches[1].id}:0'
+            )
+        )
+        await communicator.connect()
+        response = await communicator.receive_json_from()
+        assert response['data']['id'] == f'{dispatches[0].id}'
+        assert await communicator.receive_nothing(timeout=0.1)
+        await communicator.disconnect()
+
+    async def test_illegal_status_transition_is_rejected(self, settings):
+        settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
+        contractor, access = await create_user(
+            'test.driver@example.com', 'pAssw0rd', 'contractor'
+        )
+        dispatch = await create_dispatch(
+            status=Dispatch.COMPLETED, contractor=contractor
+        )
+        communicator = WebsocketCommunicator(
+            application=application,
+            path=f'/dispatch/?token={access}'
+        )
+        await communicator.connect()
+        for data in (
+            {'id': f'{dispatch.id}', 'status': Dispatch.STARTED},
+            {
+                'id': f'{dispatch.id}',
+                'status': Dispatch.REQUESTED,
+                'destination': 'Elsewhere',
+            },
+        ):
+            await communicator.send_json_to({
+                'type': 'update.dispatch',
+                'data': data,
+            })
+            response = await communicator.receive_json_from()
+            assert response['type'] == 'error'
+        dispatch = await database_sync_to_async(Dispatch.objects.get)(id=dispatch.id)
+        assert dispatch.status == Dispatch.COMPLETED
+        assert dispatch.destination == '456 Piney Road'
+        await communicator.disconnect()
+
+    async def test_contractor_location_is_coalesced_and_persisted(
+        self, settings, monkeypatch
+    ):
+        settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
+        settings.LOCATION_STREAM = {
+            **settings.LOCATION_STREAM, 'BROADCAST_INTERVAL': 0.2,
+        }
+        monkeypatch.setattr(position_store, 'persist_interval', 0.1)
+        contractor, access = await create_user(
+            'test.driver@example.com', 'pAssw0rd', 'contractor'
+        )
+        dispatch = await create_dispatch(
+            status=Dispatch.STARTED, contractor=contractor
+        )
+
+        # Listen for messages as requestor.
+        channel_layer = get_channel_layer()
+        await channel_layer.group_add(
+            group=f'{dispatch.id}',
+            channel='test_channel'
+        )
+
+        communicator = WebsocketCommunicator(
+            application=application,
+            path=f'/dispatch/?token={access}'
+        )
+        await communicator.connect()
+        for latitude in (35.68, 35.69, 35.70):
+            await communicator.send_json_to({
+                'type': 'location.update',
+                'data': {'latitude': latitude, 'longitude': 139.76},
+            })
+
+        # The first position goes out at once; the rest are coalesced into
+        # one rebroadcast of the latest position.
+        response = await channel_layer.receive('test_channel')
+        response_data = json.loads(response['text'])['data']
+        assert response_data['contractor'] == contractor.id
+        assert response_data['latitude'] == 35.68
+        response = await channel_layer.receive('test_channel')
+        assert json.loads(response['text'])['data']['latitude'] == 35.70
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(
+                channel_layer.receive('test_channel'), timeout=0.3
+            )
+
+        location = await database_sync_to_async(ContractorLocation.objects.get)(
+            contractor=contractor
+        )
+        assert location.latitude == 35.70
+        # Busy with a dispatch, so not offered new ones.
+        assert contractor.id in contractor_index
+        assert not contractor_index.is_available(contractor.id)
+        await communicator.disconnect()
+
+    async def test_location_is_not_sent_to_completed_dispatches(self, settings):
+        settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
+        requestor, requestor_access = await create_user(
+            'test.rider@example.com', 'pAssw0rd', 'requestor'
+        )
+        contractor, access = await create_user(
+            'test.driver@example.com', 'pAssw0rd', 'contractor'
+        )
+        dispatch = await create_dispatch(
+            status=Dispatch.IN_PROGRESS, requestor=requestor, contractor=contractor
+        )
+        requestor_communicator = WebsocketCommunicator(
+            application=application,
+            path=f'/dispatch/?token={requestor_access}'
+        )
+        await requestor_communicator.connect()
+        communicator = WebsocketCommunicator(
+            application=application,
+            path=f'/dispatch/?token={access}'
+        )
+        await communicator.connect()
+
+        await communicator.send_json_to({
+            'type': 'update.dispatch',
+            'data': {'id': f'{dispatch.id}', 'status': Dispatch.COMPLETED},
+        })
+        response = await requestor_communicator.receive_json_from()
+        assert response['data']['status'] == Dispatch.COMPLETED
+        await communicator.send_json_to({
+            'type': 'location.update',
+            'data': {'latitude': 35.68, 'longitude': 139.76},
+        })
+        assert await requestor_communicator.receive_nothing(timeout=0.1)
+
+        await communicator.disconnect()
+        await requestor_communicator.disconnect()
+
+    async def test_binary_protocol_sends_update_deltas(self, settings):
+        settings.CHANNEL_LAYERS = TEST_CHANNEL_LAYERS
+        user, access = await create_user(
+            'test.user@example.com', 'pAssw0rd', 'requestor'
+        )
+        communicator = WebsocketCommunicator(
+            application=application,
+            path=f'/dispatch/?token={access}',
+            subprotocols=['dispatch.msgpack']
+        )
+        connected, subprotocol = await communicator.connect()
+        assert connected is True
+        assert subprotocol == 'dispatch.msgpack'
+
+        await communicator.send_to(bytes_data=msgpack.packb({
+            'type': 'create.dispatch',
+            'data': {
+                'request_location': '123 Main Street',
+                'destination': '456 Piney Road',
+                'requestor': user.id,
+            },
+        }))
+        response = msgpack.unpackb(await communicator.receive_from())
+        assert response['type'] == 'echo.message'
+        dispatch_data = response['data']
+
+        # Malformed frames and non-map payloads are answered with errors.
+        for frame in (b'\xc1', msgpack.packb([1, 2]), msgpack.packb(3)):
+            await communicator.send_to(bytes_data=frame)
+            response = msgpack.unpackb(await communicator.receive_from())
+            assert response == {
+                'type': 'error',
+                'data': {
+                    'message_type': None,
+                    'detail': 'Frames must be MessagePack maps.',
+                },
+            }
+        assert dispatch_data['destination'] == '456 Piney Road'
+
+        await communicator.send_to(bytes_data=msgpack.packb({
+            'type': 'update.dispatch',
+            'data': {'id': dispatch_data['id'], 'destination': 'Elsewhere'},
+        }))
+        response = msgpack.unpackb(await communicator.receive_from())
+        assert response['partial'] is True
+        assert set(response['data']) == {'id', 'version', 'updated_at', 'destination'}
+        assert response['data']['destination'] == 'Elsewhere'
+        assert response['data']['version'] == dispatch_data['version'] + 1
+        await communicator.disconnect()
@@ -0,0 +1,111 @@
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from core import db, metrics
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated_at')
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = now
+
+    def refill(self, now):
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def take(self, now):
+        self.refill(now)
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class RateLimiter:
+    """
+    Token buckets per ``(key, message type)``. ``rates`` maps message types
+    to ``(messages per second, burst)``; the '*' entry covers the rest, and
+    types without either are not limited.
+
+    Buckets that have refilled are dropped every ``prune_interval`` seconds,
+    as a full bucket behaves exactly like a new one.
+    """
+
+    def __init__(self, rates, prune_interval=60.0):
+        self.rates = rates
+        self.prune_interval = prune_interval
+        self._buckets = {}
+        self._next_prune = time.monotonic() + prune_interval
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def clear(self):
+        self._buckets.clear()
+
+    def _prune(self, now):
+        self._next_prune = now + self.prune_interval
+        for bucket_key, bucket in list(self._buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.capacity:
+                del self._buckets[bucket_key]
+
+    def allow(self, key, message_type, now=None):
+        now = time.monotonic() if now is None else now
+        if now >= self._next_prune:
+            self._prune(now)
+        rate = self.rates.get(message_type, self.rates.get('*'))
+        if rate is None:
+            return True
+        bucket_key = (key, message_type)
+        bucket = self._buckets.get(bucket_key)
+        if bucket is None:
+            bucket = self._buckets[bucket_key] = TokenBucket(*rate, now)
+        return bucket.take(now)
+
+
+class AdmissionController:
+    """
+    Sheds messages that need the database while ``max_pending`` database
+    calls from async code are already queued or running in this process.
+    """
+
+    def __init__(self, max_pending):
+        self.max_pending = max_pending
+
+    def admit(self):
+        return db.get_pending() < self.max_pending
+
+
+# Shared by every connection of a user in this process.
+user_limiter = RateLimiter(settings.WEBSOCKET_RATE_LIMITS['USER'])
+admission = AdmissionController(settings.WEBSOCKET_ADMISSION['MAX_PENDING'])
+
+
+@receiver(setting_changed)
+def reload_limits(setting, value, **kwargs):
+    # Keeps the module instances in step with override_settings().
+    if setting == 'WEBSOCKET_RATE_LIMITS':
+        user_limiter.rates = value['USER']
+        user_limiter.clear()
+    elif setting == 'WEBSOCKET_ADMISSION':
+        admission.max_pending = value['MAX_PENDING']
+
+
+rejected_messages = metrics.registry.counter(
+    'websocket_rejected_messages_total', 'Inbound WebSocket messages refused.',
+    ('message_type', 'reason')
+)
+metrics.registry.collect(
+    'database_pending_calls', 'Database calls from async code queued or running.',
+    db.get_pending
+)
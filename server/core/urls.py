@@ -1,10 +1,11 @@
 from django.urls import path
 
-from .views import DispatchView
+from .views import DispatchBatchView, DispatchView
 
 app_name = 'core'
 
 urlpatterns = [
     path('', DispatchView.as_view({'get': 'list'}), name='dispatch_list'),
+    path('batch/', DispatchBatchView.as_view(), name='dispatch_batch'),
     path('<uuid:dispatch_id>/', DispatchView.as_view({'get': 'retrieve'}), name='dispatch_detail'),  # new
 ]
@@ -1,9 +1,24 @@
+import hmac
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from rest_framework import generics, permissions, viewsets
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse
+from django.views import View
+from rest_framework import generics, permissions, status, viewsets
+from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView
 
+from . import metrics
+from .broadcasts import get_contractor_groups, send_to_groups
+from .filters import DispatchFilterBackend
 from .models import Dispatch
-from .serializers import UserSerializer, LogInSerializer, DispatchSerializer
+from .pagination import KeysetPagination
+from .serializers import (
+    UserSerializer, LogInSerializer, DispatchSerializer, DispatchReadSerializer,
+)
 
 
 class SignUpView(generics.CreateAPIView):
@@ -21,3 +36,56 @@ class DispatchView(viewsets.ReadOnlyModelViewSet):
     permission_classes = (permissions.IsAuthenticated,)
     queryset = Dispatch.objects.all()
     serializer_class = DispatchSerializer
+    filter_backends = (DispatchFilterBackend,)
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if self.action != 'list' or user.is_staff:
+            return queryset
+        # Scope by role so each listing is a range scan on one indexed
+        # foreign key rather than an OR across both.
+        if user.groups.filter(name='contractor').exists():
+            return queryset.filter(contractor=user)
+        return queryset.filter(requestor=user)
+
+
+class DispatchBatchView(generics.GenericAPIView):
+    permission_classes = (permissions.IsAuthenticated,)
+    serializer_class = DispatchSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            # The batch is all-or-nothing; errors line up with the items.
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        dispatches = serializer.save()
+
+        dispatches_data = DispatchReadSerializer(dispatches, many=True).data
+        radii = range(settings.DISPATCH_GEO['RADIUS'] + 1)
+        async_to_sync(send_to_groups)(
+            get_channel_layer(),
+            get_contractor_groups(zip(dispatches, dispatches_data), radii)
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class MetricsView(View):
+    # Prometheus scrape target; hidden unless METRICS_ENABLED is set.
+    def has_access(self, request):
+        if request.user.is_staff:
+            return True
+        token = settings.METRICS['TOKEN']
+        return bool(token) and hmac.compare_digest(
+            request.headers.get('Authorization', ''), f'Bearer {token}'
+        )
+
+    def get(self, request, *args, **kwargs):
+        if not metrics.ENABLED:
+            raise Http404
+        if not self.has_access(request):
+            raise PermissionDenied
+        return HttpResponse(
+            metrics.registry.render(), content_type='text/plain; version=0.0.4'
+        )